@@ -7,11 +7,11 @@ import sys
 
 import click
 
-from future import standard_library
+from .config import DEFAULT_FS_WORKERS, DEFAULT_MAX_WORKERS, read_global_config
 
-from .config import read_global_config
-
-standard_library.install_aliases()
+if sys.version_info[0] < 3:
+    from future import standard_library
+    standard_library.install_aliases()
 
 __version__ = '2.2.0'
 
@@ -23,8 +23,31 @@ class Context(object):
 
     def __init__(self):
         self.verbose = False
+        self.max_workers = DEFAULT_MAX_WORKERS
+        self.fs_workers = DEFAULT_FS_WORKERS
+        self.poll_policy = None
+        self.profiler = None
+        self.instance = None
         self.home = os.getcwd()
         self._global_config = None
+        self._gi = None
+
+    @property
+    def gi(self):
+        """
+        The GalaxyInstance of the selected instance, created when first used
+        """
+        if self._gi is None and self.instance is not None:
+            from .cache import CachedGalaxyInstance
+            from .config import get_instance
+            gi = get_instance(self.instance, pool_size=self.max_workers)
+            gi.profiler = self.profiler
+            self._gi = CachedGalaxyInstance(gi)
+        return self._gi
+
+    @gi.setter
+    def gi(self, gi):
+        self._gi = gi
 
     @property
     def global_config(self):
@@ -0,0 +1,111 @@
+from __future__ import absolute_import
+
+import copy
+
+
+class ClientProxy(object):
+    """
+    Forward everything to a bioblend client, except the methods redefined in subclasses
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class CachedLibraries(ClientProxy):
+    """
+    Keep the lists of libraries and of their folders, until they are modified
+    """
+
+    def __init__(self, client):
+        super(CachedLibraries, self).__init__(client)
+        self._libraries = None
+        self._folders = {}
+
+    def get_libraries(self, library_id=None, name=None, deleted=False):
+        if library_id is not None or name is not None or deleted is not False:
+            return self._client.get_libraries(library_id=library_id, name=name, deleted=deleted)
+
+        if self._libraries is None:
+            self._libraries = self._client.get_libraries()
+        return copy.deepcopy(self._libraries)
+
+    def get_folders(self, library_id, folder_id=None, name=None):
+        if folder_id is not None or name is not None:
+            return self._client.get_folders(library_id, folder_id=folder_id, name=name)
+
+        if library_id not in self._folders:
+            self._folders[library_id] = self._client.get_folders(library_id)
+        return copy.deepcopy(self._folders[library_id])
+
+    def create_library(self, *args, **kwargs):
+        self._libraries = None
+        return self._client.create_library(*args, **kwargs)
+
+    def delete_library(self, library_id):
+        self._libraries = None
+        self._folders.pop(library_id, None)
+        return self._client.delete_library(library_id)
+
+    def create_folder(self, library_id, *args, **kwargs):
+        self._folders.pop(library_id, None)
+        return self._client.create_folder(library_id, *args, **kwargs)
+
+    def forget_folder(self, folder_id):
+        """
+        Forget the folders list of the library containing the given folder
+        """
+        for library_id, folders in list(self._folders.items()):
+            if folder_id in [f['id'] for f in folders]:
+                self._folders.pop(library_id, None)
+
+
+class CachedFolders(ClientProxy):
+
+    def __init__(self, client, libraries):
+        super(CachedFolders, self).__init__(client)
+        self._libraries = libraries
+
+    def create_folder(self, parent_folder_id, *args, **kwargs):
+        self._libraries.forget_folder(parent_folder_id)
+        return self._client.create_folder(parent_folder_id, *args, **kwargs)
+
+    def update_folder(self, folder_id, *args, **kwargs):
+        self._libraries.forget_folder(folder_id)
+        return self._client.update_folder(folder_id, *args, **kwargs)
+
+    def delete_folder(self, folder_id, *args, **kwargs):
+        self._libraries.forget_folder(folder_id)
+        return self._client.delete_folder(folder_id, *args, **kwargs)
+
+
+class CachedRoles(ClientProxy):
+
+    def __init__(self, client):
+        super(CachedRoles, self).__init__(client)
+        self._roles = None
+
+    def get_roles(self):
+        if self._roles is None:
+            self._roles = self._client.get_roles()
+        return copy.deepcopy(self._roles)
+
+    def create_role(self, *args, **kwargs):
+        self._roles = None
+        return self._client.create_role(*args, **kwargs)
+
+
+class CachedGalaxyInstance(ClientProxy):
+    """
+    Wrap a GalaxyInstance to fetch the lists of libraries, library folders and roles only once per run,
+    until they are modified using the same instance
+    """
+
+    def __init__(self, gi):
+        super(CachedGalaxyInstance, self).__init__(gi)
+        self.libraries = CachedLibraries(gi.libraries)
+        self.folders = CachedFolders(gi.folders, self.libraries)
+        self.roles = CachedRoles(gi.roles)
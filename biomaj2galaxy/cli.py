@@ -1,17 +1,61 @@
+from __future__ import print_function
+
+import importlib
+import sys
+
 from biomaj2galaxy import __version__
 from biomaj2galaxy import pass_context
 
 import click
 
-from .commands.add import add as func0
-from .commands.add_lib import add_lib as func2
-from .commands.init import init as func4
-from .commands.rm import rm as func1
-from .commands.rm_lib import rm_lib as func3
-from .config import get_instance, global_config_path, set_global_config_path
+from .config import DEFAULT_FS_WORKERS, DEFAULT_MAX_WORKERS, get_instance_config, get_poll_policy, global_config_path, set_global_config_path
+
+# Subcommands, imported only when used, with their short help (to list them without importing them)
+COMMANDS = {
+    'add': ('biomaj2galaxy.commands.add:add', "Add data to a Galaxy data table."),
+    'rm': ('biomaj2galaxy.commands.rm:rm', "Remove data from Galaxy data tables."),
+    'add-lib': ('biomaj2galaxy.commands.add_lib:add_lib', "Add data to a Galaxy data library."),
+    'rm-lib': ('biomaj2galaxy.commands.rm_lib:rm_lib', "Remove data from the LIBRARY Galaxy data library."),
+    'sync-lib': ('biomaj2galaxy.commands.sync_lib:sync_lib', "Synchronize a Galaxy data library folder with a list of local files/directories."),
+    'init': ('biomaj2galaxy.commands.init:init', "Help initialize global configuration (in home directory)."),
+    'status': ('biomaj2galaxy.commands.status:status', "Show the state of the jobs submitted with the --no-wait option."),
+    'finalize': ('biomaj2galaxy.commands.finalize:finalize', "Check the jobs submitted with the --no-wait option."),
+}
+
+
+class LazyGroup(click.Group):
+    """
+    A click group importing the module of a subcommand only when it is used
+    """
+
+    def list_commands(self, ctx):
+        return sorted(set(super(LazyGroup, self).list_commands(ctx)) | set(COMMANDS.keys()))
+
+    def get_command(self, ctx, cmd_name):
+        # Old click versions kept the underscores in command names (e.g. add_lib)
+        cmd_name = cmd_name.replace('_', '-')
+        if cmd_name not in self.commands and cmd_name in COMMANDS:
+            module_name, func_name = COMMANDS[cmd_name][0].split(':')
+            self.add_command(getattr(importlib.import_module(module_name), func_name), cmd_name)
+        return super(LazyGroup, self).get_command(ctx, cmd_name)
 
+    def format_commands(self, ctx, formatter):
+        """
+        List the subcommands in the help, without importing them
+        """
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            if cmd_name in COMMANDS:
+                rows.append((cmd_name, COMMANDS[cmd_name][1]))
+            else:
+                rows.append((cmd_name, self.get_command(ctx, cmd_name).get_short_help_str()))
 
-@click.group()
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup)
 @click.version_option(__version__)
 @click.option('-v', '--verbose', is_flag=True,
               help='Enables verbose mode.')
@@ -28,27 +72,78 @@ from .config import get_instance, global_config_path, set_global_config_path
     help="config file path",
     type=str
 )
+@click.option(
+    "--max-workers",
+    help="Maximum number of concurrent requests sent to the Galaxy server. This parameter can also be set via the environment variable BM2G_MAX_WORKERS",
+    envvar='BM2G_MAX_WORKERS',
+    default=DEFAULT_MAX_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1)
+)
+@click.option(
+    "--fs-workers",
+    help="Maximum number of files checked concurrently on the local file system. This parameter can also be set via the environment variable BM2G_FS_WORKERS",
+    envvar='BM2G_FS_WORKERS',
+    default=DEFAULT_FS_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1)
+)
+@click.option(
+    "--poll-min-interval",
+    help="Delay (in seconds) before checking the first time if a job is finished (default=0.5, or 'polling: min_interval' in config file)",
+    envvar='BM2G_POLL_MIN_INTERVAL',
+    type=click.FloatRange(min=0)
+)
+@click.option(
+    "--poll-max-interval",
+    help="Maximum delay (in seconds) between two checks of a running job, the delay increasing exponentially up to this value (default=30, or 'polling: max_interval' in config file)",
+    envvar='BM2G_POLL_MAX_INTERVAL',
+    type=click.FloatRange(min=0)
+)
+@click.option(
+    "--profile",
+    help="Print a summary of the requests sent to the Galaxy server (calls, latency and payload size by endpoint) and of the time spent waiting, at exit",
+    is_flag=True
+)
+@click.option(
+    "--profile-output",
+    help="Also save the cProfile statistics of the main thread to this file (implies --profile)",
+    type=click.Path(dir_okay=False, writable=True)
+)
 @pass_context
-def biomaj2galaxy(ctx, instance, verbose, path=None):
+def biomaj2galaxy(ctx, instance, verbose, max_workers, fs_workers, poll_min_interval, poll_max_interval, profile, profile_output, path=None):
     # set config_path if provided
     if path is not None and len(path) > 0:
         set_global_config_path(path)
-    # We abuse this, knowing that calls to one will fail.
     current_ctx = click.get_current_context()
-    ctx.gi = None
-    try:
-        ctx.gi = get_instance(instance)
-    except TypeError:
-        pass
+    instance_config = get_instance_config(instance)
 
-    if current_ctx.invoked_subcommand not in ['init'] and ctx.gi is None:
+    if current_ctx.invoked_subcommand not in ['init'] and not instance_config:
         raise Exception("Could not read config file '%s', run `biomaj2galaxy init` to create it, or set BM2G_GLOBAL_CONFIG_PATH to the correct location." % global_config_path())
 
+    # The Galaxy instance is created when first used, see Context.gi
+    ctx.instance = instance
     ctx.verbose = verbose
+    ctx.max_workers = max_workers
+    ctx.fs_workers = fs_workers
+
+    poll_policy = dict(instance_config.get('polling') or {})
+    poll_policy.update({k: v for k, v in [('min_interval', poll_min_interval), ('max_interval', poll_max_interval)] if v is not None})
+    ctx.poll_policy = get_poll_policy(poll_policy)
+
+    if profile or profile_output:
+        from .profiling import Profiler
+        ctx.profiler = Profiler()
+        current_ctx.call_on_close(ctx.profiler.print_summary)
+
+    if profile_output:
+        import cProfile
+        c_profile = cProfile.Profile()
 
+        def dump_stats():
+            c_profile.disable()
+            c_profile.dump_stats(profile_output)
+            print("cProfile statistics saved to '%s'" % profile_output, file=sys.stderr)
 
-biomaj2galaxy.add_command(func0)
-biomaj2galaxy.add_command(func1)
-biomaj2galaxy.add_command(func2)
-biomaj2galaxy.add_command(func3)
-biomaj2galaxy.add_command(func4)
+        current_ctx.call_on_close(dump_stats)
+        c_profile.enable()
@@ -1,13 +1,266 @@
 import os
-import time
+import re
 import uuid
 
 from biomaj2galaxy import pass_context
+from biomaj2galaxy.fasta import prepare_genome
 from biomaj2galaxy.io import warn
-from biomaj2galaxy.utils import check_input, get_dbkey_entry, wait_completion
+from biomaj2galaxy.journal import add_journal_entry
+from biomaj2galaxy.utils import DEFAULT_CACHE_TTL, check_input, delete_rows, fetch_data_tables, get_dbkey_entries, get_tables_format, reload_tables, run_steps, start_steps
 
 import click
 
+import yaml
+
+
+ADD_FASTA_TOOL_ID = 'toolshed.g2.bx.psu.edu/repos/devteam/data_manager_fetch_genome_dbkeys_all_fasta/data_manager_fetch_genome_all_fasta_dbkey/0.0.4'
+DM_MANUAL_TOOL_ID = 'toolshed.g2.bx.psu.edu/repos/iuc/data_manager_manual/data_manager_manual/0.0.2'
+
+# Define some simpler synonyms for data tables
+DATA_TABLE_SYNONYMS = {
+    'fasta': 'all_fasta',
+    'bowtie': 'bowtie_indexes',
+    'bowtie2': 'bowtie2_indexes',
+    'bwa': 'bwa_indexes',
+    'bwa_mem': 'bwa_mem_indexes',
+    'tophat2': 'tophat2_indexes',
+    'star': 'rnastar_index2x_versioned',
+}
+
+# Ids generated when adding multiple entries for the same dbkey in a table
+GENERATED_VALUE = re.compile(r'^(.*)_[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def split_file_info(f):
+    """Split a 'data_table_name:/path/to/data:Data name' string, taking care of escaped ':'"""
+    f = f.replace("\\:", '___colon___')
+    f_info = f.split(':')
+    f_info = [x.replace('___colon___', ':') for x in f_info]
+
+    if len(f_info) < 2 or len(f_info) > 3:
+        raise Exception('Malformed file information "%s"' % f_info)
+
+    return f_info
+
+
+def read_manifest(manifest):
+    """
+    Read a list of dbkeys to add, with their files, from a manifest file.
+    Yaml manifests are lists of {'dbkey': ..., 'name': ..., 'files': [...]} dicts.
+    Tabular manifests (.tsv, .tab or .txt) contain one 'dbkey<TAB>display name<TAB>file' line per file.
+    The files of a dbkey listed several times are merged.
+    """
+    entries = []
+    by_dbkey = {}
+
+    def add_entry(dbkey, name, files):
+        if dbkey not in by_dbkey:
+            by_dbkey[dbkey] = {'dbkey': dbkey, 'name': None, 'files': []}
+            entries.append(by_dbkey[dbkey])
+        if name:
+            by_dbkey[dbkey]['name'] = name
+        by_dbkey[dbkey]['files'] += files
+
+    if os.path.splitext(manifest)[1].lower() in ['.tsv', '.tab', '.txt']:
+        with open(manifest) as f:
+            for line in f:
+                line = line.rstrip('\r\n')
+                if not line.strip() or line.startswith('#'):
+                    continue
+                cols = line.split('\t')
+                add_entry(cols[0], cols[1] if len(cols) > 1 else None, [cols[2]] if len(cols) > 2 and cols[2] else [])
+    else:
+        with open(manifest) as f:
+            content = yaml.safe_load(f) or []
+        if not isinstance(content, list):
+            raise Exception("Malformed manifest '%s': expecting a list of dbkeys" % manifest)
+        for entry in content:
+            if not isinstance(entry, dict) or not entry.get('dbkey'):
+                raise Exception("Malformed manifest '%s': missing dbkey in entry %s" % (manifest, entry))
+            add_entry(str(entry['dbkey']), entry.get('name'), list(entry.get('files') or []))
+
+    return entries
+
+
+def prepare_dbkey(dbkey, dbkey_display_name, files_info, tables_format, dbkey_entry, genome_fasta, guess_name=True):
+    """
+    Check what needs to be done for the given dbkey, and set the default name of each file.
+    If guess_name is False, the display name is not guessed from the BioMAJ env variables (they are the same for all
+    the dbkeys of a manifest).
+    Returns a (create_dbkey, default_name, dbkey_display_name, table_counts) tuple
+    """
+    # Check which tables we're touching
+    table_counts = {}
+    for f_info in files_info:
+        if f_info['table'] not in table_counts:
+            table_counts[f_info['table']] = 0
+
+        table_counts[f_info['table']] += 1
+
+    # Verify dbkey
+    dbkey_exists = dbkey_entry is not None
+
+    need_dbkey = bool(genome_fasta) or (len(table_counts) == 0)
+    for c in table_counts.keys():
+        need_dbkey = need_dbkey or 'dbkey' in tables_format[c]
+        if need_dbkey:
+            break
+
+    create_dbkey = dbkey and not dbkey_exists and need_dbkey
+
+    if create_dbkey:
+        print("Need to create the dbkey '" + dbkey + "'")
+    elif dbkey and dbkey_exists:
+        print("The dbkey '" + dbkey + "' already exists")
+    elif not dbkey and not need_dbkey:
+        print("No dbkey was specified, but it is not a problem as we don't need it.")
+    elif not dbkey and need_dbkey:
+        raise Exception("ERROR: You must specify a dbkey to perform the action(s) you requested.")
+
+    # Prepare a default display name that will be used if not specified
+    if not dbkey_display_name and guess_name:
+        if 'dbname' in os.environ and 'remoterelease' in os.environ:
+            dbkey_display_name = "%s (%s)" % (os.environ['dbname'], os.environ['remoterelease'])
+
+    default_name = dbkey_display_name
+    if not default_name and dbkey_entry:
+        print("Trying to use dbkey_entry name: " + dbkey_entry[1])
+        default_name = dbkey_entry[1]
+    if not default_name:
+        default_name = dbkey
+
+    for f_info in files_info:
+        if 'name' not in f_info:
+            if not default_name:
+                f_info['name'] = os.path.basename(f_info['path'])
+            else:
+                f_info['name'] = default_name
+
+    return create_dbkey, default_name, dbkey_display_name, table_counts
+
+
+def build_rows(dbkey, files_info, table_counts, tables_format, star_with_gtf, star_version):
+    """
+    Compute the data table rows to add for the given dbkey.
+    Returns a list of (table, row) tuples, with row being a list of values in the table columns order
+    """
+    rows = []
+    for f_info in files_info:
+
+        vals = {
+            'dbkey': dbkey,
+            'name': f_info['name'],
+            'path': f_info['path'] if 'path' in f_info else '',
+            'db_path': f_info['path'] if 'path' in f_info else '',  # diamond data table
+            'url': f_info['path'] if 'path' in f_info else '',
+            'with-gtf': '1' if star_with_gtf else '0',  # rnastar data table, old data table
+            'with_gene_model': '1' if star_with_gtf else '0',  # rnastar data table, recent data table
+            'version': star_version if star_version else '0',  # rnastar data table, recent data table
+            'len_path': f_info['path'] if 'path' in f_info else '',  # __dbkeys__data table
+        }
+
+        if dbkey and table_counts[f_info['table']] == 1:  # The id must be unique, only use dbkey if adding only one blastdb
+            vals['value'] = dbkey
+        else:
+            vals['value'] = dbkey + "_" + str(uuid.uuid4())  # Let it be generated
+
+        row = []
+        for col in tables_format[f_info['table']]:
+            if col not in vals:
+                warn("Skipping unknown column named '%s' in table '%s'." % (col, f_info['table']))
+            row.append(vals.get(col, ''))
+
+        rows.append((f_info['table'], row))
+
+    return rows
+
+
+def print_new_row(table, row, columns):
+    """
+    Log the addition of a row to a data table
+    """
+    vals = dict(zip(columns, row))
+    path = vals.get('path') or vals.get('db_path') or vals.get('len_path') or vals.get('url')
+    if path:
+        print("Adding a new entry to table '%s': '%s' -> '%s'" % (table, vals.get('name', vals.get('value')), path))
+    else:
+        print("Adding a new entry to table '%s': '%s' -> No path" % (table, vals.get('name', vals.get('value'))))
+
+
+def diff_rows(rows, tables_format, current_tables):
+    """
+    Compare the rows to add with the current content of the tables.
+    Rows already present are skipped. Rows with the same id (value column) as an existing one, but different content, replace it.
+    Rows with a generated id replace the existing rows with a generated id for the same dbkey and name (e.g. the blast
+    databases of a previous release), except the ones with the same content, which are kept.
+    Returns a (rows_to_add, rows_to_delete) tuple of lists of (table, row) tuples
+    """
+    to_add = []
+    to_delete = []
+    replaced = {}  # Existing rows with a generated id replaced by new ones, for each table
+    kept = {}  # Existing rows with a generated id having the same content as a new one
+    for table, row in rows:
+        fields = current_tables[table]['fields']
+
+        if row in fields:
+            print("Skipping entry already present in table '%s': %s" % (table, row))
+            continue
+
+        if 'value' not in tables_format[table]:
+            to_add.append((table, row))
+            continue
+
+        value_index = tables_format[table].index('value')
+        name_index = tables_format[table].index('name') if 'name' in tables_format[table] else None
+
+        def without_value(line):
+            return line[:value_index] + line[value_index + 1:]
+
+        def generated_prefix(line):
+            generated = GENERATED_VALUE.match(line[value_index]) if len(line) > value_index else None
+            return generated.group(1) if generated else None
+
+        prefix = generated_prefix(row)
+        if prefix is not None:
+            group = [i for i, f in enumerate(fields) if generated_prefix(f) == prefix and (name_index is None or (len(f) > name_index and f[name_index] == row[name_index]))]
+            replaced.setdefault(table, set()).update(group)
+
+            same = [i for i in group if without_value(fields[i]) == without_value(row)]
+            if same:
+                print("Skipping entry already present in table '%s': %s" % (table, fields[same[0]]))
+                kept.setdefault(table, set()).add(same[0])
+                continue
+        else:
+            for f in fields:
+                if len(f) > value_index and f[value_index] == row[value_index]:
+                    print("Replacing entry in table '%s': %s -> %s" % (table, f, row))
+                    to_delete.append((table, f))
+
+        to_add.append((table, row))
+
+    for table, group in replaced.items():
+        for i in sorted(group - kept.get(table, set())):
+            print("Replacing entry in table '%s': %s" % (table, current_tables[table]['fields'][i]))
+            to_delete.append((table, current_tables[table]['fields'][i]))
+
+    return to_add, to_delete
+
+
+def build_manual_dm_params(rows, tables_format):
+    """
+    Build the parameters of a data_manager_manual job adding all the given (table, row) tuples
+    """
+    manual_dm_params = {}
+    for index_entry, (table, row) in enumerate(rows):
+        for col_index, (col, val) in enumerate(zip(tables_format[table], row)):
+            manual_dm_params['data_tables_%s|columns_%s|data_table_column_name' % (index_entry, col_index)] = col
+            manual_dm_params['data_tables_%s|columns_%s|data_table_column_value' % (index_entry, col_index)] = val
+            manual_dm_params['data_tables_%s|columns_%s|is_path|is_path_selector' % (index_entry, col_index)] = 'no'
+
+        manual_dm_params['data_tables_%s|data_table_name' % (index_entry)] = table
+
+    return manual_dm_params
+
 
 @click.command()
 @click.argument("files", nargs=-1)
@@ -34,6 +287,11 @@ import click
     help="Display name for the full reference genome (default=--dbkey-display-name or --dbkey)",
     type=str
 )
+@click.option(
+    "--local-fasta-processing",
+    help="Sort the --genome-fasta file (if asked) and compute its len file locally (written next to it), and register the genome directly instead of running the data_manager_fetch_genome_all_fasta_dbkey data manager. The fasta and len files must be readable by the Galaxy server at the same path.",
+    is_flag=True
+)
 @click.option(
     "-s",
     "--fasta-sorting-method",
@@ -72,195 +330,216 @@ import click
     help="Add this flag if you don't want biomaj2galaxy to use BioMAJ env variables to guess file names.",
     is_flag=True
 )
+@click.option(
+    "-m",
+    "--manifest",
+    help="Yaml or tabular (.tsv) file listing multiple dbkeys to add with their files, all added in a single data manager job. Can't be used with FILES, --dbkey or --genome-fasta.",
+    type=click.Path(exists=True, dir_okay=False)
+)
+@click.option(
+    "--no-wait",
+    help="Don't wait for the Galaxy jobs to finish: they are recorded locally, run `biomaj2galaxy finalize` later to check them and reload the data tables.",
+    is_flag=True
+)
+@click.option(
+    "--cache-ttl",
+    help="Maximum age (in seconds) of the local cache of data table definitions (0 to disable the cache)",
+    default=DEFAULT_CACHE_TTL,
+    show_default=True,
+    type=click.IntRange(min=0)
+)
+@click.option(
+    "--refresh-cache",
+    help="Ignore the local cache of data table definitions and fetch them again from the Galaxy server.",
+    is_flag=True
+)
 @pass_context
-def add(ctx, files, dbkey, dbkey_display_name, genome_fasta, genome_fasta_name, fasta_sorting_method, fasta_custom_sort_list, fasta_custom_sort_handling, no_file_check, star_with_gtf, star_version, no_biomaj_env):
+def add(ctx, files, dbkey, dbkey_display_name, genome_fasta, genome_fasta_name, local_fasta_processing, fasta_sorting_method, fasta_custom_sort_list, fasta_custom_sort_handling, no_file_check, star_with_gtf, star_version, no_biomaj_env, manifest, no_wait, cache_ttl, refresh_cache):
     """Add data to a Galaxy data table. FILES is a list of path respecting this syntax: data_table_name:/path/to/data:Data name (e.g. "bowtie2:/db/some/where/my_genome:My supercool genome"). You can escape ':' by writing '\\:'"""
+    from bioblend import ConnectionError
 
-    ADD_FASTA_TOOL_ID = 'toolshed.g2.bx.psu.edu/repos/devteam/data_manager_fetch_genome_dbkeys_all_fasta/data_manager_fetch_genome_all_fasta_dbkey/0.0.4'
-    DM_MANUAL_TOOL_ID = 'toolshed.g2.bx.psu.edu/repos/iuc/data_manager_manual/data_manager_manual/0.0.2'
+    if manifest:
+        if files or dbkey or dbkey_display_name or genome_fasta:
+            raise Exception("FILES, --dbkey, --dbkey-display-name and --genome-fasta can't be used with --manifest.")
+        entries = read_manifest(manifest)
+    else:
+        entries = [{'dbkey': dbkey, 'name': dbkey_display_name, 'files': files}]
 
-    # Fetch the list of known tables with their columns
-    tables_format = {}
-    tables = ctx.gi.tool_data.get_data_tables()
-    for t in tables:
-        tables_format[t['name']] = ctx.gi.tool_data.show_data_table(t['name'])['columns']
-
-        # A stupid fix for the twobit table which for some unknown reason doesn't have a 'name' column_name
-        # As this 'name' column is required for a data table, the galaxy code adds a non-existing one when it is not found in the table defintion.
-        if t['name'] == 'twobit' and 'name' in tables_format[t['name']]:
-            tables_format[t['name']].remove('name')
-
-    # Define some simpler synonyms for data tables
-    data_table_synonyms = {
-        'fasta': 'all_fasta',
-        'bowtie': 'bowtie_indexes',
-        'bowtie2': 'bowtie2_indexes',
-        'bwa': 'bwa_indexes',
-        'bwa_mem': 'bwa_mem_indexes',
-        'tophat2': 'tophat2_indexes',
-        'star': 'rnastar_index2x_versioned',
-    }
-
-    files_info = []
-    for f in files:
-        f = f.replace("\\:", '___colon___')
-        f_info = f.split(':')
-        f_info = [x.replace('___colon___', ':') for x in f_info]
-
-        if len(f_info) < 2 or len(f_info) > 3:
-            raise Exception('Malformed file information "%s"' % f_info)
-
-        if f_info[0] not in tables_format:
-            if f_info[0] in data_table_synonyms:
-                f_info[0] = data_table_synonyms[f_info[0]]
-            else:
-                raise Exception('Unknown data table name "%s"' % f_info[0])
-
-        f_info[1] = check_input([f_info[1]], check_existence=(not no_file_check), use_biomaj_env=(not no_biomaj_env))[0]
-
-        if len(f_info) == 3:
-            files_info.append({'table': f_info[0], 'path': f_info[1], 'name': f_info[2]})
-        else:
-            files_info.append({'table': f_info[0], 'path': f_info[1]})
+    if local_fasta_processing and genome_fasta and no_file_check:
+        raise Exception("--local-fasta-processing requires reading the --genome-fasta file, it can't be used with --no-file-check.")
+    if fasta_sorting_method == 'custom' and not fasta_custom_sort_list:
+        raise Exception("--fasta-custom-sort-list is required when using '-s custom'.")
 
-    # Check which tables we're touching
-    table_counts = {}
-    for f_info in files_info:
-        if f_info['table'] not in table_counts:
-            table_counts[f_info['table']] = 0
-
-        table_counts[f_info['table']] += 1
-
-    # Verify dbkey
-    dbkey_entry = get_dbkey_entry(ctx.gi, dbkey)
-    dbkey_exists = dbkey_entry is not None
-
-    need_dbkey = genome_fasta or (len(table_counts) == 0)
-    for c in table_counts.keys():
-        need_dbkey = 'dbkey' in tables_format[c]
-        if need_dbkey:
-            break
+    # Fetch the list of known tables with their columns
+    tables_format = get_tables_format(ctx.gi, max_workers=ctx.max_workers, cache_ttl=cache_ttl, refresh=refresh_cache)
+    tables_refreshed = refresh_cache or cache_ttl == 0
 
-    create_dbkey = dbkey and not dbkey_exists and need_dbkey
+    for entry in entries:
+        entry['files_info'] = []
+        for f in entry['files']:
+            f_info = split_file_info(f)
 
-    if create_dbkey:
-        print("Need to create the dbkey '" + dbkey + "'")
-    elif dbkey and dbkey_exists:
-        print("The dbkey '" + dbkey + "' already exists")
-    elif not dbkey and not need_dbkey:
-        print("No dbkey was specified, but it is not a problem as we don't need it.")
-    elif not dbkey and need_dbkey:
-        raise Exception("ERROR: You must specify a dbkey to perform the action(s) you requested.")
+            if f_info[0] not in tables_format and f_info[0] in DATA_TABLE_SYNONYMS:
+                f_info[0] = DATA_TABLE_SYNONYMS[f_info[0]]
 
-    # Prepare a default display name that will be used if not specified
-    if not dbkey_display_name:
-        if 'dbname' in os.environ and 'remoterelease' in os.environ:
-            dbkey_display_name = "%s (%s)" % (os.environ['dbname'], os.environ['remoterelease'])
+            if f_info[0] not in tables_format and not tables_refreshed:
+                # The table may have been created since the cache was written
+                print("Unknown data table name '%s', refreshing the data tables cache" % f_info[0])
+                tables_format = get_tables_format(ctx.gi, max_workers=ctx.max_workers, cache_ttl=cache_ttl, refresh=True)
+                tables_refreshed = True
 
-    default_name = dbkey_display_name
-    if not default_name and dbkey_entry:
-        print("Trying to use dbkey_entry name: " + dbkey_entry[1])
-        default_name = dbkey_entry[1]
-    if not default_name:
-        default_name = dbkey
+            if f_info[0] not in tables_format:
+                raise Exception('Unknown data table name "%s"' % f_info[0])
 
-    for f_info in files_info:
-        if 'name' not in f_info:
-            if not default_name:
-                f_info['name'] = os.path.basename(f_info['path'])
+            if len(f_info) == 3:
+                entry['files_info'].append({'table': f_info[0], 'path': f_info[1], 'name': f_info[2]})
             else:
-                f_info['name'] = default_name
+                entry['files_info'].append({'table': f_info[0], 'path': f_info[1]})
 
-    # Add the genome fasta if asked
-    if genome_fasta:
-        if not create_dbkey:
-            # delete the existing dbkey to force the recomputing of len file
-            print("Deleting the dbkey entry before recreating it (needed to recompute the len file).")
-            ctx.gi.tool_data.delete_data_table('__dbkeys__', "\t".join(dbkey_entry))
+    # Check all the files at once
+    all_files_info = [f_info for entry in entries for f_info in entry['files_info']]
+    if all_files_info:
+        paths = check_input([f_info['path'] for f_info in all_files_info], check_existence=(not no_file_check), use_biomaj_env=(not no_biomaj_env), max_workers=ctx.fs_workers)
+        for f_info, path in zip(all_files_info, paths):
+            f_info['path'] = path
 
-        if not genome_fasta_name:
-            genome_fasta_name = default_name
+    dbkey_entries = get_dbkey_entries(ctx.gi)
 
-        genome_fasta_abs = check_input([genome_fasta], check_existence=(not no_file_check), use_biomaj_env=(not no_biomaj_env))[0]
-
-        # the dbkey is not (or not longer) existing: create it while adding the ref genome to force the computing of the len file
-        print("Adding a new genome using fasta file '%s' -> '%s'" % (genome_fasta_name, genome_fasta_abs))
-        params = {}
-        params['dbkey_source|dbkey_source_selector'] = 'new'
-        params['dbkey_source|dbkey'] = dbkey
-        params['dbkey_source|dbkey_name'] = default_name
-        params['sequence_name'] = genome_fasta_name
-        params['reference_source|reference_source_selector'] = 'directory'
-        params['reference_source|fasta_filename'] = genome_fasta_abs
-        params['reference_source|create_symlink'] = 'true'
-        params['sorting|sort_selector'] = fasta_sorting_method
-        if fasta_sorting_method == 'custom':
-            params['sorting|handle_not_listed|handle_not_listed_selector'] = fasta_custom_sort_handling
-            n = 0
-            for i in fasta_custom_sort_list.split(','):
-                params['sorting|sequence_identifiers_' + n + '|identifier'] = i
-                n += 1
-        fetch_res = ctx.gi.tools.run_tool(None, ADD_FASTA_TOOL_ID, params)
-        datasetid = fetch_res['outputs'][0]['id']
-        jobid = None
-        if 'jobs' in fetch_res:
-            jobid = fetch_res['jobs'][0]['id']
-        wait_completion(ctx.gi, datasetid, jobid)
-
-    elif create_dbkey:  # Create the dbkey without ref genome (no len computing)
-        print("Will create the dbkey '" + dbkey + "'")
-        files_info.append({'table': '__dbkeys__', 'name': dbkey_display_name})
-        table_counts['__dbkeys__'] = 1
-
-    # Now add all associated data
-    manual_dm_params = {}
-    index_entry = 0
-    for f_info in files_info:
+    rows = []
+    touched_tables = []
+    steps = []
+    for entry in entries:
+        dbkey = entry['dbkey']
+        files_info = entry['files_info']
+        dbkey_entry = dbkey_entries.get(dbkey)
 
-        if 'path' in f_info:
-            print("Adding a new entry to table '%s': '%s' -> '%s'" % (f_info['table'], f_info['name'], f_info['path']))
-        else:
-            print("Adding a new entry to table '%s': '%s' -> No path" % (f_info['table'], f_info['name']))
+        create_dbkey, default_name, dbkey_display_name, table_counts = prepare_dbkey(dbkey, entry['name'], files_info, tables_format, dbkey_entry, genome_fasta, guess_name=not manifest)
 
-        vals = {
-            'dbkey': dbkey,
-            'name': f_info['name'],
-            'path': f_info['path'] if 'path' in f_info else '',
-            'db_path': f_info['path'] if 'path' in f_info else '',  # diamond data table
-            'url': f_info['path'] if 'path' in f_info else '',
-            'with-gtf': '1' if star_with_gtf else '0',  # rnastar data table, old data table
-            'with_gene_model': '1' if star_with_gtf else '0',  # rnastar data table, recent data table
-            'version': star_version if star_version else '0',  # rnastar data table, recent data table
-            'len_path': f_info['path'] if 'path' in f_info else '',  # __dbkeys__data table
-        }
-
-        if dbkey and table_counts[f_info['table']] == 1:  # The id must be unique, only use dbkey if adding only one blastdb
-            vals['value'] = dbkey
-        else:
-            vals['value'] = dbkey + "_" + str(uuid.uuid4())  # Let it be generated
+        if genome_fasta and not genome_fasta_name:
+            genome_fasta_name = default_name
 
-        col_index = 0
-        for col in tables_format[f_info['table']]:
-            if col not in vals:
-                warn("Skipping unknown column named '%s' in table '%s'." % (col, f_info['table']))
+        # Add the genome fasta if asked
+        if genome_fasta and local_fasta_processing:
+            genome_fasta_abs = check_input([genome_fasta], use_biomaj_env=(not no_biomaj_env))[0]
 
-            manual_dm_params['data_tables_%s|columns_%s|data_table_column_name' % (index_entry, col_index)] = col
-            manual_dm_params['data_tables_%s|columns_%s|data_table_column_value' % (index_entry, col_index)] = vals[col]
-            manual_dm_params['data_tables_%s|columns_%s|is_path|is_path_selector' % (index_entry, col_index)] = 'no'
-            col_index += 1
-
-        manual_dm_params['data_tables_%s|data_table_name' % (index_entry)] = f_info['table']
-        index_entry += 1
-
-    fetch_res = ctx.gi.tools.run_tool(None, DM_MANUAL_TOOL_ID, manual_dm_params)
-    datasetid = fetch_res['outputs'][0]['id']
-    jobid = None
-    if 'jobs' in fetch_res:
-        jobid = fetch_res['jobs'][0]['id']
-    wait_completion(ctx.gi, datasetid, jobid)
-
-    # Reload all tables just in case
-    time.sleep(1)  # Reloading too soon might not work for some strange reason
-    for table in table_counts:
-        print("Reloading table '%s'" % table)
-        ctx.gi.tool_data.reload_data_table(table)
+            if fasta_sorting_method != 'as_is':
+                print("Sorting fasta file '%s' (%s) and computing its len file" % (genome_fasta_abs, fasta_sorting_method))
+            else:
+                print("Computing the len file of fasta file '%s'" % genome_fasta_abs)
+            custom_list = fasta_custom_sort_list.split(',') if fasta_custom_sort_list else None
+            genome_fasta_abs, len_path = prepare_genome(genome_fasta_abs, fasta_sorting_method, custom_list, fasta_custom_sort_handling)
+
+            print("Adding a new genome using fasta file '%s' -> '%s'" % (genome_fasta_name, genome_fasta_abs))
+            files_info.append({'table': 'all_fasta', 'path': genome_fasta_abs, 'name': genome_fasta_name})
+            files_info.append({'table': '__dbkeys__', 'path': len_path, 'name': dbkey_display_name or default_name})
+            for table in ['all_fasta', '__dbkeys__']:
+                table_counts[table] = table_counts.get(table, 0) + 1
+
+        elif genome_fasta:
+            if not create_dbkey:
+                # delete the existing dbkey to force the recomputing of len file
+                print("Deleting the dbkey entry before recreating it (needed to recompute the len file).")
+                ctx.gi.tool_data.delete_data_table('__dbkeys__', "\t".join(dbkey_entry))
+
+            genome_fasta_abs = check_input([genome_fasta], check_existence=(not no_file_check), use_biomaj_env=(not no_biomaj_env))[0]
+
+            # the dbkey is not (or not longer) existing: create it while adding the ref genome to force the computing of the len file
+            print("Adding a new genome using fasta file '%s' -> '%s'" % (genome_fasta_name, genome_fasta_abs))
+            params = {}
+            params['dbkey_source|dbkey_source_selector'] = 'new'
+            params['dbkey_source|dbkey'] = dbkey
+            params['dbkey_source|dbkey_name'] = default_name
+            params['sequence_name'] = genome_fasta_name
+            params['reference_source|reference_source_selector'] = 'directory'
+            params['reference_source|fasta_filename'] = genome_fasta_abs
+            params['reference_source|create_symlink'] = 'true'
+            params['sorting|sort_selector'] = fasta_sorting_method
+            if fasta_sorting_method == 'custom':
+                params['sorting|handle_not_listed|handle_not_listed_selector'] = fasta_custom_sort_handling
+                n = 0
+                for i in fasta_custom_sort_list.split(','):
+                    params['sorting|sequence_identifiers_%s|identifier' % n] = i
+                    n += 1
+            steps.append({
+                'name': 'fasta_%s' % dbkey,
+                'job': {'tool_id': ADD_FASTA_TOOL_ID, 'params': params, 'name': "Genome fasta for '%s'" % dbkey},
+                'depends': [],
+                'tables': ['all_fasta', '__dbkeys__'],  # Written by the data manager
+            })
+
+        elif create_dbkey:  # Create the dbkey without ref genome (no len computing)
+            print("Will create the dbkey '" + dbkey + "'")
+            files_info.append({'table': '__dbkeys__', 'name': dbkey_display_name or default_name})
+            table_counts['__dbkeys__'] = 1
+
+        # Now add all associated data
+        rows += build_rows(dbkey, files_info, table_counts, tables_format, star_with_gtf, star_version)
+
+        for table in table_counts:
+            if table not in touched_tables:
+                touched_tables.append(table)
+
+    # Only add what is not already in the tables
+    try:
+        current_tables = fetch_data_tables(ctx.gi, names=touched_tables, max_workers=ctx.max_workers)
+    except ConnectionError as e:
+        if tables_refreshed:
+            raise
+
+        # A table may have been removed since the cache was written
+        print("Failed to download the data tables (%s), refreshing the data tables cache" % e)
+        old_format = tables_format
+        tables_format = get_tables_format(ctx.gi, max_workers=ctx.max_workers, cache_ttl=cache_ttl, refresh=True)
+        for table in touched_tables:
+            if table not in tables_format:
+                raise Exception('Unknown data table name "%s"' % table)
+            if tables_format[table] != old_format.get(table):
+                raise Exception("The columns of data table '%s' changed since the data tables cache was written, please run the command again" % table)
+        current_tables = fetch_data_tables(ctx.gi, names=touched_tables, max_workers=ctx.max_workers)
+    rows, old_rows = diff_rows(rows, tables_format, current_tables)
+
+    if not rows and not old_rows and not steps:
+        print("All the entries are already present in the data tables, nothing to do.")
+        return
+
+    if rows:
+        for table, row in rows:
+            print_new_row(table, row, tables_format[table])
+
+        # Entries don't depend on the genome fasta jobs, except if both write in the same data table
+        manual_tables = set(table for table, row in rows)
+        steps.append({
+            'name': 'manual',
+            'job': {'tool_id': DM_MANUAL_TOOL_ID, 'params': build_manual_dm_params(rows, tables_format), 'name': "Data tables entries"},
+            'depends': [step['name'] for step in steps if manual_tables & set(step['tables'])],
+        })
+
+    # Reload the modified tables once finished, checking that the new entries are visible
+    expected = {}
+    for table, row in rows:
+        expected.setdefault(table, {'present': [], 'absent': []})['present'].append(row)
+
+    if no_wait and steps:
+        # Jobs depending on other ones are launched later by `biomaj2galaxy finalize`, and the old entries are
+        # deleted by it once all the jobs are finished
+        submitted, waiting = start_steps(ctx.gi, steps)
+        entry = add_journal_entry(ctx.gi, 'add', ', '.join(str(e['dbkey']) for e in entries), submitted, expected, waiting, old_rows)
+        print("Submitted %s job(s) without waiting (journal entry %s), run `biomaj2galaxy finalize` to reload the data tables once finished." % (len(submitted), entry['id']))
+        if waiting:
+            print("%s job(s) depending on them will be submitted by `biomaj2galaxy finalize`." % len(waiting))
+        return
+
+    # Launch independent jobs together
+    run_steps(ctx.gi, steps, poll_policy=ctx.poll_policy)
+
+    # The old entries are only deleted once their replacements are added
+    failed = {}
+    if old_rows:
+        deleted, failed = delete_rows(ctx.gi, old_rows, max_workers=ctx.max_workers, poll_policy=ctx.poll_policy)
+        for table, table_rows in deleted.items():
+            expected.setdefault(table, {'present': [], 'absent': []})['absent'] += table_rows
+
+    reload_tables(ctx.gi, expected, max_workers=ctx.max_workers, poll_policy=ctx.poll_policy)
+
+    if failed:
+        raise Exception("Failed to delete the old entries from tables: %s" % ', '.join(failed.keys()))
@@ -5,7 +5,8 @@ from __future__ import print_function
 import os
 
 from biomaj2galaxy import pass_context
-from biomaj2galaxy.utils import add_files, check_existing, check_input, create_tree, get_library, get_roles
+from biomaj2galaxy.journal import add_journal_entry
+from biomaj2galaxy.utils import DEFAULT_BATCH_SIZE, add_files, check_existing, check_input, create_trees, get_library, get_roles, sources_by_folder, wait_all
 
 import click
 
@@ -64,8 +65,26 @@ import click
     help="Add this flag if you don't want biomaj2galaxy to use BioMAJ env variables to guess file names.",
     is_flag=True
 )
+@click.option(
+    "--no-wait",
+    help="Don't wait for the uploaded files to be ready: they are recorded locally, run `biomaj2galaxy status` or `biomaj2galaxy finalize` later to check them.",
+    is_flag=True
+)
+@click.option(
+    "--batch-size",
+    help="Number of files to upload in a single request",
+    default=DEFAULT_BATCH_SIZE,
+    show_default=True,
+    type=click.IntRange(min=1)
+)
+@click.option(
+    "-r",
+    "--recursive",
+    help="Add source directories recursively, as subfolders of the data library folder reproducing their tree of subdirectories",
+    is_flag=True
+)
 @pass_context
-def add_lib(ctx, sources, library, folder, roles, lib_desc, lib_synopsis, datatype, no_file_check, replace, no_biomaj_env):
+def add_lib(ctx, sources, library, folder, roles, lib_desc, lib_synopsis, datatype, no_file_check, replace, no_biomaj_env, no_wait, batch_size, recursive):
     """Add data to a Galaxy data library, where SOURCES a list of file/directories to add."""
 
     if not sources:
@@ -78,7 +97,10 @@ def add_lib(ctx, sources, library, folder, roles, lib_desc, lib_synopsis, dataty
         else:
             raise Exception('No library defined. Use the --library option.')
 
-    sources = check_input(sources, check_existence=(not no_file_check), use_biomaj_env=(not no_biomaj_env))
+    if recursive and no_file_check:
+        raise Exception("--recursive requires listing the source directories, it can't be used with --no-file-check.")
+
+    sources = check_input(sources, check_existence=(not no_file_check), use_biomaj_env=(not no_biomaj_env), allow_dirs=recursive, max_workers=ctx.fs_workers)
 
     r_roles = []
     if roles:
@@ -92,17 +114,37 @@ def add_lib(ctx, sources, library, folder, roles, lib_desc, lib_synopsis, dataty
         folder = '/'
     dest = os.path.normpath(folder)
     dest = dest.split(os.sep)
-    dest = [x for x in dest if x]  # Remove empty string when sep at the begin or end, or multiple sep
+    dest = tuple(x for x in dest if x)  # Remove empty string when sep at the begin or end, or multiple sep
+
+    # Files to add in each folder
+    files_by_folder = sources_by_folder(sources, dest, recursive)
 
     found_lib = get_library(ctx.gi, library, lib_desc, lib_synopsis)
 
     print("Preparing folders in library '" + library + "'")
 
-    dest_folder = create_tree(ctx.gi, found_lib, dest)
+    folder_ids = create_trees(ctx.gi, found_lib, list(files_by_folder.keys()), max_workers=ctx.max_workers)
+
+    items = []
+    for path, files in sorted(files_by_folder.items()):
+        if not files:
+            continue
+
+        check_existing(ctx.gi, found_lib, list(path), files, replace, folder_id=folder_ids[path])
+
+        print("Adding " + str(len(files)) + " file(s) to the folder '/" + "/".join(path) + "' of the library '" + library + "'")
+        uploaded = add_files(ctx.gi, found_lib, folder_ids[path], files, [], datatype, batch_size=batch_size)
+
+        items += [{'dataset_id': u['id'], 'name': u['name'], 'library_id': found_lib, 'folder_id': folder_ids[path]} for u in uploaded]
 
-    check_existing(ctx.gi, found_lib, dest, sources, replace)
+    if r_roles and items:
+        ctx.gi.libraries.set_library_permissions(found_lib, access_in=r_roles)
 
-    print("Adding " + str(len(sources)) + " file(s) to the library '" + library + "'")
-    add_files(ctx.gi, found_lib, dest_folder, sources, r_roles, datatype)
+    if no_wait:
+        entry = add_journal_entry(ctx.gi, 'add_lib', library, items)
+        print("Not waiting for the file(s) to be ready (journal entry %s), run `biomaj2galaxy status` to check them." % entry['id'])
+    else:
+        print("Waiting for the file(s) to be ready")
+        wait_all(ctx.gi, items, poll_policy=ctx.poll_policy)
 
     print("Done!")
@@ -0,0 +1,104 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from biomaj2galaxy import pass_context
+from biomaj2galaxy.io import error
+from biomaj2galaxy.journal import read_journal, remove_journal_entry, write_journal_entry
+from biomaj2galaxy.utils import DATASET_FINISHED_STATES, delete_rows, get_states, reload_tables, start_steps, wait_all
+
+import click
+
+
+@click.command()
+@click.option(
+    "--wait",
+    help="Wait for all the recorded jobs to finish (by default, jobs that are still running are left for a later run).",
+    is_flag=True
+)
+@click.option(
+    "--discard-failed",
+    help="Forget the recorded jobs that finished in error state (by default, they are kept and reported at each run).",
+    is_flag=True
+)
+@pass_context
+def finalize(ctx, wait, discard_failed):
+    """Check the jobs submitted with the --no-wait option, submit the jobs that were waiting for them, and delete the replaced data table entries and reload the data tables once they are all finished"""
+
+    entries = read_journal(ctx.gi)
+    if not entries:
+        print("No job recorded, nothing to finalize")
+        return
+
+    failures = 0
+    while entries:
+        items = [item for entry in entries for item in entry['items']]
+        if wait:
+            states = wait_all(ctx.gi, items, exit_on_error=False, poll_policy=ctx.poll_policy)
+        else:
+            states = get_states(ctx.gi, items)
+
+        finished = []
+        launched = []
+        for entry in entries:
+            entry_states = [states.get(item['dataset_id']) for item in entry['items']]
+
+            if [s for s in entry_states if s not in DATASET_FINISHED_STATES]:
+                print("Jobs of %s '%s' (%s) are still running" % (entry['command'], entry['description'], entry['id']))
+                continue
+
+            failed = [item for item, state in zip(entry['items'], entry_states) if state != 'ok']
+            if failed:
+                failures += 1
+                error("%s job(s) of %s '%s' (%s) finished in error state" % (len(failed), entry['command'], entry['description'], entry['id']))
+                if discard_failed:
+                    remove_journal_entry(entry)
+                continue
+
+            if entry.get('steps'):
+                # Launch the jobs that were waiting for the finished ones
+                new_items, entry['steps'] = start_steps(ctx.gi, entry['steps'], done=[item.get('step') for item in entry['items']])
+                if not new_items:
+                    raise Exception("Can't launch the remaining jobs of %s '%s' (%s): unknown dependencies" % (entry['command'], entry['description'], entry['id']))
+                entry['items'] += new_items
+                write_journal_entry(entry)
+                print("Submitted %s job(s) of %s '%s' (%s)" % (len(new_items), entry['command'], entry['description'], entry['id']))
+                launched.append(entry)
+                continue
+
+            if not isinstance(entry['reload_tables'], dict):
+                entry['reload_tables'] = {t: {} for t in entry['reload_tables']}
+
+            if entry.get('old_rows'):
+                # The replaced entries are only deleted once the new ones are added
+                deleted, failed_rows = delete_rows(ctx.gi, [(table, row) for table, row in entry['old_rows']], max_workers=ctx.max_workers, poll_policy=ctx.poll_policy)
+                for table, rows in deleted.items():
+                    entry['reload_tables'].setdefault(table, {}).setdefault('absent', []).extend(rows)
+                entry['old_rows'] = [[table, row] for table, rows in failed_rows.items() for row in rows]
+                if entry['old_rows']:
+                    failures += 1
+                    write_journal_entry(entry)
+                    error("Failed to delete %s old entries of %s '%s' (%s), they will be deleted at the next run" % (len(entry['old_rows']), entry['command'], entry['description'], entry['id']))
+                    continue
+
+            finished.append(entry)
+
+        to_reload = {}
+        for entry in finished:
+            for table, expected in entry['reload_tables'].items():
+                to_reload.setdefault(table, {'present': [], 'absent': []})
+                to_reload[table]['present'] += expected.get('present', [])
+                to_reload[table]['absent'] += expected.get('absent', [])
+
+        if to_reload:
+            reload_tables(ctx.gi, to_reload, max_workers=ctx.max_workers, poll_policy=ctx.poll_policy)
+
+        for entry in finished:
+            print("Finalized %s '%s' (%s)" % (entry['command'], entry['description'], entry['id']))
+            remove_journal_entry(entry)
+
+        # The jobs just launched are followed until finished with --wait, or checked at the next run
+        entries = launched if wait else []
+
+    if failures:
+        raise Exception("%s recorded run(s) had failed jobs" % failures)
@@ -5,8 +5,6 @@ from __future__ import print_function
 
 import os
 
-from bioblend import galaxy
-
 from biomaj2galaxy import config, pass_context
 from biomaj2galaxy.io import info, warn
 
@@ -47,6 +45,7 @@ def init(ctx, url=None, api_key=None, admin=False, **kwds):
 
         info("Testing connection...")
         try:
+            from bioblend import galaxy  # Long to import, only needed here
             instance = galaxy.GalaxyInstance(url=url, key=apikey)
             instance.libraries.get_libraries()
             # We do a connection test during startup.
@@ -1,6 +1,7 @@
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 from biomaj2galaxy import pass_context
+from biomaj2galaxy.utils import DEFAULT_CACHE_TTL, delete_rows, get_tables_format, index_rows, match_rows, reload_tables
 
 import click
 
@@ -13,9 +14,39 @@ import click
     help="Remove only exact matches instead of removing all lines with an id beginning with the given dbkey.",
     is_flag=True
 )
+@click.option(
+    "-p",
+    "--pattern",
+    help="Another dbkey or pattern to remove (can be given several times, never split on commas)",
+    multiple=True,
+    type=str
+)
+@click.option(
+    "--regex",
+    help="DBKEY and --pattern are regular expressions instead of glob patterns (DBKEY is then not split on commas).",
+    is_flag=True
+)
+@click.option(
+    "--cache-ttl",
+    help="Maximum age (in seconds) of the local cache of data table definitions (0 to disable the cache)",
+    default=DEFAULT_CACHE_TTL,
+    show_default=True,
+    type=click.IntRange(min=0)
+)
+@click.option(
+    "--refresh-cache",
+    help="Ignore the local cache of data table definitions and fetch them again from the Galaxy server.",
+    is_flag=True
+)
 @pass_context
-def rm(ctx, dbkey, tables, exact):
-    """Remove data from Galaxy data tables, where DBKEY is the id of the data to remove, and TABLES is an optional list of tables to remove data from (by default, data will be removed in all tables)."""
+def rm(ctx, dbkey, tables, exact, pattern, regex, cache_ttl, refresh_cache):
+    """Remove data from Galaxy data tables, where DBKEY is the id of the data to remove (or a comma-separated list of ids or glob patterns, see also --pattern), and TABLES is an optional list of tables to remove data from (by default, data will be removed in all tables)."""
+
+    # Regular expressions can contain commas (e.g. '{1,2}')
+    patterns = [dbkey] if regex else dbkey.split(',')
+    patterns = [d for d in patterns + list(pattern) if d]
+    if not patterns:
+        raise Exception('No dbkey given')
 
     # Define some simpler synonyms for data tables
     data_table_synonyms = {
@@ -27,58 +58,86 @@ def rm(ctx, dbkey, tables, exact):
         'tophat2': 'tophat2_indexes',
     }
 
-    # Fetch the list of known tables with their columns
-    tables_format = {}
-    tables_entries = {}
-    online_tables = ctx.gi.tool_data.get_data_tables()
-    for t in online_tables:
-        content = ctx.gi.tool_data.show_data_table(t['name'])
-        tables_format[t['name']] = content['columns']
-        tables_entries[t['name']] = content['fields']
-
-    tables_to_clean = []
-    if tables:
-        for table in tables:
-            if table in data_table_synonyms:
-                table = data_table_synonyms[table]
-
-            if table in tables_format:
-                tables_to_clean.append(table)
-            else:
-                raise Exception('Unknown data table name "%s"' % table)
-    else:
-        tables_to_clean = tables_format.keys()
-
-    print("Will remove '%s' entries from tables: \n%s" % (dbkey, ', '.join(tables_to_clean)))
-
-    # Always delete from the __dbkeys__ table
-    table = '__dbkeys__'
-    if 'value' in tables_format[table]:
-        dbkey_field = tables_format[table].index('value')
-
-        for line in tables_entries[table]:
-            if line[dbkey_field] == dbkey:
-                print("Deleting from '" + table + "' table")
-                ctx.gi.tool_data.delete_data_table(table, "\t".join(line))
-
-    # Remove from asked tables
-    for table in tables_to_clean:
-        if 'dbkey' in tables_format[table]:
-            dbkey_field = tables_format[table].index('dbkey')
-        elif 'value' in tables_format[table]:
-            dbkey_field = tables_format[table].index('value')
-        else:
-            continue
-
-        for line in tables_entries[table]:
-            if len(line) > dbkey_field:  # Sometimes Galaxy is lying (featurecounts_anno table)
-                if (exact and line[dbkey_field] == dbkey) or (not exact and line[dbkey_field].startswith(dbkey)):
-                    print("Deleting from '" + table + "' table")
-                    ctx.gi.tool_data.delete_data_table(table, "\t".join(line))
-
-    # Reload all tables just in case
-    time.sleep(1)  # Reloading too soon might not work for some strange reason
+    requested = [data_table_synonyms.get(table, table) for table in tables]
+
+    def table_rules(table, columns):
+        """
+        Decide which column to look at in a table, and how.
+        Returns a list of (column, exact match) tuples
+        """
+        rules = []
+
+        # Always delete from the __dbkeys__ table
+        if table == '__dbkeys__' and 'value' in columns:
+            rules.append(('value', True))
+
+        # Remove from asked tables
+        if not requested or table in requested:
+            if 'dbkey' in columns:
+                rules.append(('dbkey', exact))
+            elif 'value' in columns:
+                rules.append(('value', exact))
+
+        return rules
+
+    def find_rows(table, content=None):
+        """
+        Download a table (if needed), and only keep the rows to delete
+        """
+        if content is None:
+            content = ctx.gi.tool_data.show_data_table(table)
+        found = set()
+        for column, exact_match in table_rules(table, content['columns']):
+            index = index_rows(content['fields'], content['columns'].index(column))
+            found.update(match_rows(index, patterns, exact=exact_match, regex=regex))
+        return [content['fields'][i] for i in sorted(found)]
+
+    # Rows to delete from the tables downloaded to get their format (when not in the cache)
+    found_rows = {}
+
+    def on_content(table, content):
+        found_rows[table] = find_rows(table, content)
+
+    # Get the list of known tables with their columns, without their content
+    tables_format = get_tables_format(ctx.gi, max_workers=ctx.max_workers, cache_ttl=cache_ttl, refresh=refresh_cache, on_content=on_content)
+    if not refresh_cache and cache_ttl > 0 and not found_rows:
+        known_tables = [t['name'] for t in ctx.gi.tool_data.get_data_tables()]
+        if set(known_tables) != set(tables_format.keys()):
+            # Some tables were added or removed since the cache was written
+            tables_format = get_tables_format(ctx.gi, max_workers=ctx.max_workers, cache_ttl=cache_ttl, refresh=True, on_content=on_content)
+
+    for table in requested:
+        if table not in tables_format:
+            raise Exception('Unknown data table name "%s"' % table)
+    tables_to_clean = requested or list(tables_format.keys())
+
+    print("Will remove '%s' entries from tables: \n%s" % ("', '".join(patterns), ', '.join(tables_to_clean)))
+
+    rules_tables = [t for t in ['__dbkeys__'] + tables_to_clean if t in tables_format and table_rules(t, tables_format[t])]
+    rules_tables = sorted(set(rules_tables), key=rules_tables.index)
+
+    # Only download the relevant tables not downloaded yet
+    to_fetch = [t for t in rules_tables if t not in found_rows]
+    with ThreadPoolExecutor(max_workers=max(1, ctx.max_workers)) as executor:
+        for table, lines in zip(to_fetch, executor.map(find_rows, to_fetch)):
+            found_rows[table] = lines
+
+    to_delete = []
+    for table in rules_tables:
+        to_delete += [(table, line) for line in found_rows[table]]
+
+    if not to_delete:
+        print("No entry found, nothing to do.")
+        return
+
+    print("Deleting %s entries" % len(to_delete))
+    deleted, failed = delete_rows(ctx.gi, to_delete, max_workers=ctx.max_workers, poll_policy=ctx.poll_policy)
+
+    # Reload the modified tables, checking that the entries are gone
     print("Reloading tables")
-    for table in tables_to_clean:
-        ctx.gi.tool_data.reload_data_table(table)
+    reload_tables(ctx.gi, {table: {'absent': lines} for table, lines in deleted.items()}, max_workers=ctx.max_workers, poll_policy=ctx.poll_policy)
+
+    if failed:
+        raise Exception("Failed to delete %s entries from tables: %s" % (sum(len(lines) for lines in failed.values()), ', '.join(failed.keys())))
+
     print("Done")
@@ -0,0 +1,40 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+from biomaj2galaxy import pass_context
+from biomaj2galaxy.journal import read_journal
+from biomaj2galaxy.utils import DATASET_FINISHED_STATES, get_states
+
+import click
+
+
+@click.command()
+@pass_context
+def status(ctx):
+    """Show the state of the jobs submitted with the --no-wait option"""
+
+    entries = read_journal(ctx.gi)
+    if not entries:
+        print("No job recorded, nothing to check")
+        return
+
+    items = [item for entry in entries for item in entry['items']]
+    states = get_states(ctx.gi, items)
+
+    for entry in entries:
+        entry_states = [states.get(item['dataset_id']) for item in entry['items']]
+        ok = len([s for s in entry_states if s == 'ok'])
+        running = len([s for s in entry_states if s not in DATASET_FINISHED_STATES])
+        failed = len(entry_states) - ok - running
+
+        print("%s %s %s '%s': %s ok, %s running, %s failed" % (entry['id'], time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['time'])), entry['command'], entry['description'], ok, running, failed))
+        for item, state in zip(entry['items'], entry_states):
+            if state in DATASET_FINISHED_STATES and state != 'ok':
+                print("    '%s' finished in '%s' state" % (item.get('name') or item['dataset_id'], state))
+        for step in entry.get('steps', []):
+            print("    '%s' will be submitted by `biomaj2galaxy finalize` once the running jobs are finished" % (step['job'].get('name') or step['name']))
+        if entry.get('old_rows'):
+            print("    %s replaced entries will be deleted from the data tables by `biomaj2galaxy finalize` once all the jobs are finished" % len(entry['old_rows']))
@@ -0,0 +1,256 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from biomaj2galaxy import pass_context
+from biomaj2galaxy.journal import add_journal_entry
+from biomaj2galaxy.sync import file_hash, file_info, is_unchanged, read_sync_state, write_sync_state
+from biomaj2galaxy.utils import DEFAULT_BATCH_SIZE, add_files, check_input, create_trees, get_folder_contents, get_library, get_roles, sources_by_folder, wait_all
+
+import click
+
+# Library datasets in these states are uploaded again
+FAILED_STATES = ['error', 'failed_metadata', 'discarded']
+
+
+@click.command()
+@click.argument("sources", nargs=-1, type=click.Path())
+@click.option(
+    "-l",
+    "--library",
+    help="Name of the destination library (default=guessed from BioMAJ bank name, ie $dbname env var)",
+    type=str
+)
+@click.option(
+    "-f",
+    "--folder",
+    help="Data library folder to synchronize with the sources (default=/)",
+    default="/",
+    type=str
+)
+@click.option(
+    "--roles",
+    help="Restrict acces to given role(s) (comma separated list). WARNING: the permission of the whole library is modified when using this option.",
+    default="",
+    type=str
+)
+@click.option(
+    "--lib-desc",
+    help="Library description (only used if the library does not already exist)",
+    default="",
+    type=str
+)
+@click.option(
+    "--lib-synopsis",
+    help="Library synopsis (only used if the library does not already exist)",
+    default="",
+    type=str
+)
+@click.option(
+    "--datatype",
+    help="Datatype of the file(s) to add to the data library (default=auto detect)",
+    default="auto",
+    type=str
+)
+@click.option(
+    "--checksum",
+    help="Compare the content of the files (md5 checksum) instead of their modification time to detect changes",
+    is_flag=True
+)
+@click.option(
+    "--keep-stale",
+    help="Don't remove the files of the data library folder that are no longer in the sources",
+    is_flag=True
+)
+@click.option(
+    "--dry-run",
+    help="Only show what would be done",
+    is_flag=True
+)
+@click.option(
+    "--no-biomaj-env",
+    help="Add this flag if you don't want biomaj2galaxy to use BioMAJ env variables to guess file names.",
+    is_flag=True
+)
+@click.option(
+    "--no-wait",
+    help="Don't wait for the uploaded files to be ready: they are recorded locally, run `biomaj2galaxy status` or `biomaj2galaxy finalize` later to check them.",
+    is_flag=True
+)
+@click.option(
+    "--batch-size",
+    help="Number of files to upload in a single request",
+    default=DEFAULT_BATCH_SIZE,
+    show_default=True,
+    type=click.IntRange(min=1)
+)
+@pass_context
+def sync_lib(ctx, sources, library, folder, roles, lib_desc, lib_synopsis, datatype, checksum, keep_stale, dry_run, no_biomaj_env, no_wait, batch_size):
+    """Synchronize a Galaxy data library folder with a list of local files/directories (SOURCES), adding only new or modified files, and removing the files that are no longer in the sources."""
+
+    if not sources:
+        print("Nothing to do")
+        return
+
+    if not library:
+        if 'dbname' in os.environ:
+            library = os.environ['dbname']
+        else:
+            raise Exception('No library defined. Use the --library option.')
+
+    sources = check_input(sources, use_biomaj_env=(not no_biomaj_env), allow_dirs=True, max_workers=ctx.fs_workers)
+
+    r_roles = []
+    if roles:
+        print("Checking roles")
+        roles = roles.split(',')
+        r_roles = get_roles(ctx.gi, roles)
+
+    if not folder:
+        folder = '/'
+    dest = os.path.normpath(folder)
+    dest = dest.split(os.sep)
+    dest = tuple(x for x in dest if x)  # Remove empty string when sep at the begin or end, or multiple sep
+
+    # Local files to put in each folder
+    files_by_folder = sources_by_folder(sources, dest)
+
+    local = {}
+    for path, files in files_by_folder.items():
+        for f in files:
+            local["/" + "/".join(path + (os.path.basename(f),))] = file_info(f)
+
+    def synced(path, dataset_id):
+        """
+        Describe a synchronized file in the state file
+        """
+        if checksum and not local[path]['hash']:
+            local[path]['hash'] = file_hash(local[path]['source'])
+        return dict(local[path], dataset_id=dataset_id)
+
+    if dry_run and library not in [lib['name'] for lib in ctx.gi.libraries.get_libraries() if not lib['deleted']]:
+        print("The library '%s' does not exist yet" % library)
+        found_lib = None
+    else:
+        found_lib = get_library(ctx.gi, library, lib_desc, lib_synopsis)
+
+    # Library files currently in the synchronized folder and its subfolders
+    dest_path = "/" + "/".join(dest)
+    remote_folders = []
+    if found_lib:
+        remote_folders = [f for f in ctx.gi.libraries.get_folders(found_lib) if f['name'] == dest_path or f['name'].startswith(dest_path.rstrip('/') + '/')]
+    with ThreadPoolExecutor(max_workers=max(1, ctx.max_workers)) as executor:
+        folder_contents = list(executor.map(lambda f: get_folder_contents(ctx.gi, f['id']), remote_folders))
+
+    remote = {}
+    for f, contents in zip(remote_folders, folder_contents):
+        for item in contents:
+            if item['type'] == 'file' and not item.get('deleted'):
+                remote.setdefault(f['name'].rstrip('/') + "/" + item['name'], []).append(item)
+
+    state = read_sync_state(ctx.gi, found_lib) if found_lib else {}
+
+    unchanged = []
+    to_check = []
+    to_upload = []
+    to_delete = []
+    for path in sorted(local.keys()):
+        items = remote.get(path, [])
+        known = state.get(path, {})
+        current = [i for i in items if i['id'] == known.get('dataset_id')]
+        if current and current[0].get('state') not in FAILED_STATES and is_unchanged(local[path], known, checksum):
+            unchanged.append(path)
+            if checksum and not known.get('hash'):
+                state[path] = synced(path, known['dataset_id'])
+            to_delete += [i['id'] for i in items if i is not current[0]]
+        elif items and not known:
+            # Not synchronized yet: check the linked file
+            to_check.append(path)
+        else:
+            to_upload.append(path)
+            to_delete += [i['id'] for i in items]
+
+    def check_linked_file(path):
+        dataset = ctx.gi.libraries.show_dataset(found_lib, remote[path][0]['id'])
+        return dataset.get('file_name') == local[path]['source'] and dataset.get('file_size') == local[path]['size'] and dataset.get('state') not in FAILED_STATES
+
+    with ThreadPoolExecutor(max_workers=max(1, ctx.max_workers)) as executor:
+        checked = list(executor.map(check_linked_file, to_check))
+
+    for path, same in zip(to_check, checked):
+        if same:
+            unchanged.append(path)
+            to_delete += [i['id'] for i in remote[path][1:]]
+            state[path] = synced(path, remote[path][0]['id'])
+        else:
+            to_upload.append(path)
+            to_delete += [i['id'] for i in remote[path]]
+
+    stale = [path for path in sorted(remote.keys()) if path not in local]
+    if not keep_stale:
+        to_delete += [i['id'] for path in stale for i in remote[path]]
+
+    print("%s new file(s), %s modified file(s), %s unchanged file(s), %s file(s) no longer in the sources%s" % (
+        len([p for p in to_upload if p not in remote]),
+        len([p for p in to_upload if p in remote]),
+        len(unchanged),
+        len(stale),
+        " (kept)" if keep_stale else ""))
+
+    if dry_run:
+        for path in to_upload:
+            print("Would add %s" % path)
+        if not keep_stale:
+            for path in stale:
+                print("Would remove %s" % path)
+        return
+
+    if to_delete:
+        print("Removing %s dataset(s) from the library '%s'" % (len(to_delete), library))
+        with ThreadPoolExecutor(max_workers=max(1, ctx.max_workers)) as executor:
+            list(executor.map(lambda d: ctx.gi.libraries.delete_library_dataset(found_lib, d), to_delete))
+
+    for path in stale:
+        if not keep_stale:
+            state.pop(path, None)
+
+    print("Preparing folders in library '" + library + "'")
+    folder_ids = create_trees(ctx.gi, found_lib, list(files_by_folder.keys()), max_workers=ctx.max_workers)
+
+    upload_paths = set(to_upload)
+    items = []
+    for path, files in sorted(files_by_folder.items()):
+        lib_dir = "/" + "/".join(path)
+        files = [f for f in files if lib_dir.rstrip('/') + "/" + os.path.basename(f) in upload_paths]
+        if not files:
+            continue
+
+        print("Adding " + str(len(files)) + " file(s) to the folder '" + lib_dir + "' of the library '" + library + "'")
+        uploaded = add_files(ctx.gi, found_lib, folder_ids[path], files, [], datatype, batch_size=batch_size)
+
+        for u in uploaded:
+            lib_path = lib_dir.rstrip('/') + "/" + u['name']
+            if lib_path in local:
+                state[lib_path] = synced(lib_path, u['id'])
+        items += [{'dataset_id': u['id'], 'name': u['name'], 'library_id': found_lib, 'folder_id': folder_ids[path]} for u in uploaded]
+
+    if r_roles and items:
+        ctx.gi.libraries.set_library_permissions(found_lib, access_in=r_roles)
+
+    write_sync_state(ctx.gi, found_lib, state)
+
+    if not items:
+        print("Done!")
+        return
+
+    if no_wait:
+        entry = add_journal_entry(ctx.gi, 'sync_lib', library, items)
+        print("Not waiting for the file(s) to be ready (journal entry %s), run `biomaj2galaxy status` to check them." % entry['id'])
+    else:
+        print("Waiting for the file(s) to be ready")
+        wait_all(ctx.gi, items, poll_policy=ctx.poll_policy)
+
+    print("Done!")
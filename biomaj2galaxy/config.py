@@ -1,13 +1,21 @@
 from __future__ import absolute_import
 
 import os
+import re
 
-from bioblend import galaxy
-
-import yaml
+DEFAULT_CONFIG = {
+}
 
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_FS_WORKERS = 8
 
-DEFAULT_CONFIG = {
+# How often to check if a job is finished: the delay starts at min_interval seconds and is multiplied by factor
+# after each check, up to max_interval seconds. A random variation of +/- jitter (ratio) is applied to each delay.
+DEFAULT_POLL_POLICY = {
+    'min_interval': 0.5,
+    'max_interval': 30,
+    'factor': 1.5,
+    'jitter': 0.2,
 }
 
 _config_path = os.environ.get(
@@ -26,13 +34,37 @@ def set_global_config_path(config_path):
     DEFAULT_CONFIG['config_path'] = config_path
 
 
+def get_poll_policy(policy=None):
+    """
+    Complete a (partial) polling policy dict with default values
+    """
+    full_policy = dict(DEFAULT_POLL_POLICY)
+    if policy:
+        full_policy.update({k: v for k, v in policy.items() if v is not None})
+
+    if full_policy['max_interval'] < full_policy['min_interval']:
+        full_policy['max_interval'] = full_policy['min_interval']
+
+    return full_policy
+
+
+def tables_cache_path(url):
+    """
+    Path to the data tables cache file of the Galaxy instance at the given url, next to the global config file
+    """
+    cache_dir = os.path.join(os.path.dirname(global_config_path()), '.bm2g_cache')
+    return os.path.join(cache_dir, re.sub('[^A-Za-z0-9.-]+', '_', url).strip('_') + '.json')
+
+
 def read_global_config():
     config_path = global_config_path()
     if not os.path.exists(config_path):
         return DEFAULT_CONFIG
 
+    import yaml  # Not needed to show the help
+
     with open(config_path) as f:
-        return yaml.load(f)
+        return yaml.safe_load(f)
 
 
 def _get_instance(instance_name=None):
@@ -55,7 +87,21 @@ def _get_instance(instance_name=None):
     return conf[instance_name]
 
 
-def get_instance(instance_name=None, offline=False):
+def get_instance_config(instance_name=None):
+    """
+    Get the configuration of the given instance (url, apikey and optional settings)
+    """
+    return _get_instance(instance_name=instance_name) or {}
+
+
+def get_instance(instance_name=None, offline=False, pool_size=None):
+    # bioblend.galaxy and requests are long to import: only do it when a Galaxy instance is needed
+    from biomaj2galaxy.session import PooledGalaxyInstance
+
     conf = _get_instance(instance_name=instance_name)
-    return galaxy.GalaxyInstance(url=conf['url'],
-                                 key=conf['apikey'],)
+    http = dict(conf.get('http') or {})
+    if pool_size and not http.get('pool_size'):
+        http['pool_size'] = pool_size
+    return PooledGalaxyInstance(url=conf['url'],
+                                key=conf['apikey'],
+                                http=http)
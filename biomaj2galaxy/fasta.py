@@ -0,0 +1,154 @@
+from __future__ import absolute_import
+
+import mmap
+import os
+
+# Size of the blocks read at once when counting bases: memory usage doesn't depend on the size of the sequences
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Karyotypic order used by GATK (same as the data_manager_fetch_genome_dbkeys_all_fasta data manager)
+GATK_ORDER = ['chrM'] + ['chr%s' % x for x in list(range(1, 23)) + ['X', 'Y']]
+
+
+def index_fasta(fasta_path):
+    """
+    Index the sequences of a fasta file in one pass over the memory-mapped file (like a samtools .fai index).
+    Returns a list of (name, length, start, end) tuples, where start and end are the offsets of the whole record
+    (header included) in the file
+    """
+    records = []
+    with open(fasta_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return records
+
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            size = mm.size()
+
+            # Skip anything before the first header
+            if mm[0:1] == b'>':
+                start = 0
+            else:
+                start = mm.find(b'\n>')
+                start = size if start < 0 else start + 1
+
+            while start < size:
+                header_end = mm.find(b'\n', start)
+                if header_end < 0:
+                    header_end = size
+
+                header = mm[start + 1:header_end].split(None, 1)
+                name = header[0].decode('utf-8') if header else ''
+
+                end = mm.find(b'\n>', header_end)
+                end = size if end < 0 else end + 1
+
+                length = 0
+                for offset in range(header_end + 1, end, CHUNK_SIZE):
+                    chunk = mm[offset:min(offset + CHUNK_SIZE, end)]
+                    length += len(chunk.translate(None, b' \t\r\n'))
+
+                records.append((name, length, start, end))
+                start = end
+        finally:
+            mm.close()
+
+    return records
+
+
+def sort_records(records, method, custom_list=None, custom_handling='discard'):
+    """
+    Sort the records of a fasta index using one of the methods of the data_manager_fetch_genome_dbkeys_all_fasta data manager:
+    'as_is', 'lexicographical', 'gatk' or 'custom' (using the custom_list of identifiers, and keeping
+    or not the non-listed sequences according to custom_handling: 'discard', 'keep_append' or 'keep_prepend')
+    """
+    if method == 'lexicographical':
+        return sorted(records, key=lambda r: r[0])
+
+    by_name = {}
+    for r in records:
+        by_name.setdefault(r[0], r)
+
+    if method == 'gatk':
+        order = GATK_ORDER
+        if not [name for name in order if name in by_name]:
+            # Chromosome names without the 'chr' prefix
+            order = ['MT'] + [name.replace('chr', '') for name in order[1:]]
+        listed = [by_name[name] for name in order if name in by_name]
+        listed_names = set(r[0] for r in listed)
+        return listed + [r for r in records if r[0] not in listed_names]
+
+    if method == 'custom':
+        if not custom_list:
+            raise Exception("A list of sequence identifiers is required for the custom sorting method")
+        listed = []
+        for name in custom_list:
+            if name not in by_name:
+                raise Exception("Sequence identifier '%s' was not found in the fasta file" % name)
+            listed.append(by_name[name])
+        listed_names = set(custom_list)
+        others = [r for r in records if r[0] not in listed_names]
+        if custom_handling == 'keep_append':
+            return listed + others
+        elif custom_handling == 'keep_prepend':
+            return others + listed
+        return listed
+
+    return list(records)
+
+
+def sort_fasta(fasta_path, output_path, records, method, custom_list=None, custom_handling='discard'):
+    """
+    Write a sorted copy of a fasta file (see sort_records()), copying each record as a slice of the memory-mapped input file.
+    Returns the index of the new file
+    """
+    sorted_records = []
+    with open(fasta_path, 'rb') as f_in, open(output_path, 'wb') as f_out:
+        if not records:
+            return sorted_records
+
+        mm = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with memoryview(mm) as view:
+                offset = 0
+                for name, length, start, end in sort_records(records, method, custom_list, custom_handling):
+                    f_out.write(view[start:end])
+                    record_size = end - start
+                    if view[end - 1:end] != b'\n':
+                        # The last record of the input file may not end with a new line
+                        f_out.write(b'\n')
+                        record_size += 1
+                    sorted_records.append((name, length, offset, offset + record_size))
+                    offset += record_size
+        finally:
+            mm.close()
+
+    return sorted_records
+
+
+def write_len_file(records, len_path):
+    """
+    Write a .len file (sequence name and length) from a fasta index
+    """
+    with open(len_path, 'w') as f:
+        for name, length, start, end in records:
+            f.write("%s\t%s\n" % (name, length))
+
+
+def prepare_genome(fasta_path, sorting_method='as_is', custom_list=None, custom_handling='discard'):
+    """
+    Sort a genome fasta file if needed (the sorted copy is written next to it, with a .sorted suffix) and compute its len file.
+    Returns the paths of the (sorted) fasta file and of the len file
+    """
+    records = index_fasta(fasta_path)
+
+    if sorting_method != 'as_is':
+        base, ext = os.path.splitext(fasta_path)
+        sorted_path = base + '.sorted' + ext
+        records = sort_fasta(fasta_path, sorted_path, records, sorting_method, custom_list, custom_handling)
+        fasta_path = sorted_path
+
+    len_path = os.path.splitext(fasta_path)[0] + '.len'
+    write_len_file(records, len_path)
+
+    return fasta_path, len_path
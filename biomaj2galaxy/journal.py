@@ -0,0 +1,77 @@
+from __future__ import absolute_import
+
+import json
+import os
+import time
+import uuid
+
+from biomaj2galaxy.config import global_config_path
+
+
+def journal_dir():
+    """
+    Directory where the jobs submitted with --no-wait are recorded, next to the global config file
+    """
+    return os.path.join(os.path.dirname(global_config_path()), '.bm2g_journal')
+
+
+def add_journal_entry(gi, command, description, items, reload_tables=None, steps=None, old_rows=None):
+    """
+    Record some submitted jobs (see utils.get_states() for the items format), the jobs to launch once they are
+    finished (see utils.start_steps()), the (table, row) data table entries to delete once all of them are finished
+    successfully, and the data tables to reload then (see utils.reload_tables() for the format).
+    Each entry is written in its own file to allow concurrent runs.
+    """
+    entry = {
+        'id': str(uuid.uuid4()),
+        'time': time.time(),
+        'url': gi.base_url,
+        'command': command,
+        'description': description,
+        'items': items,
+        'reload_tables': reload_tables or [],
+        'steps': steps or [],
+        'old_rows': old_rows or [],
+    }
+
+    write_journal_entry(entry)
+
+    return entry
+
+
+def write_journal_entry(entry):
+    if not os.path.isdir(journal_dir()):
+        os.makedirs(journal_dir())
+
+    entry_path = os.path.join(journal_dir(), entry['id'] + '.json')
+    with open(entry_path + '.tmp', 'w') as f:
+        json.dump(entry, f)
+    os.rename(entry_path + '.tmp', entry_path)
+
+
+def read_journal(gi):
+    """
+    Get all the recorded entries for the given Galaxy instance, oldest first
+    """
+    entries = []
+    if not os.path.isdir(journal_dir()):
+        return entries
+
+    for fn in os.listdir(journal_dir()):
+        if not fn.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(journal_dir(), fn)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            continue
+        if entry.get('url') == gi.base_url:
+            entries.append(entry)
+
+    return sorted(entries, key=lambda e: e['time'])
+
+
+def remove_journal_entry(entry):
+    entry_path = os.path.join(journal_dir(), entry['id'] + '.json')
+    if os.path.exists(entry_path):
+        os.remove(entry_path)
@@ -0,0 +1,110 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import re
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+# Path segments replaced by {id} in endpoint names: Galaxy encoded ids and numbers
+ID_SEGMENT = re.compile(r'^([0-9a-f]{16}|[0-9]+)$')
+
+
+def endpoint_name(method, url):
+    """
+    Name of the API endpoint of a request, e.g. 'GET /api/jobs/{id}'
+    """
+    path = urlparse(url).path
+    if '/api/' in path:
+        path = path[path.index('/api/'):]
+    segments = ['{id}' if ID_SEGMENT.match(s) else s for s in path.split('/')]
+    return "%s %s" % (method, '/'.join(segments))
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of a sorted list
+    """
+    if not values:
+        return 0
+    rank = int(math.ceil(p / 100. * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def format_bytes(size):
+    for unit in ['B', 'kB', 'MB']:
+        if size < 1024:
+            return "%.0f %s" % (size, unit) if unit == 'B' else "%.1f %s" % (size, unit)
+        size /= 1024.
+    return "%.1f GB" % size
+
+
+class Profiler(object):
+    """
+    Record the requests sent to Galaxy (duration, payload size and status by endpoint), and the time spent waiting
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.requests = {}
+        self.waits = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, method, url, duration, sent=0, received=0, status_code=None):
+        name = endpoint_name(method, url)
+        with self._lock:
+            stats = self.requests.setdefault(name, {'durations': [], 'errors': 0, 'sent': 0, 'received': 0})
+            stats['durations'].append(duration)
+            stats['sent'] += sent
+            stats['received'] += received
+            if status_code is None or status_code >= 400:
+                stats['errors'] += 1
+
+    def record_wait(self, reason, duration):
+        """
+        Record time spent sleeping (polling for jobs, waiting before a retry, ...)
+        """
+        with self._lock:
+            stats = self.waits.setdefault(reason, {'count': 0, 'total': 0})
+            stats['count'] += 1
+            stats['total'] += duration
+
+    def summary(self):
+        """
+        Lines of a table summarizing the recorded requests and waits
+        """
+        lines = []
+        lines.append("%-60s %6s %6s %9s %8s %8s %8s %8s %10s %10s" % ('Endpoint', 'Calls', 'Errors', 'Total (s)', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'max (ms)', 'Sent', 'Received'))
+        with self._lock:
+            requests = sorted(self.requests.items(), key=lambda r: -sum(r[1]['durations']))
+            waits = sorted(self.waits.items(), key=lambda w: -w[1]['total'])
+
+            for name, stats in requests:
+                durations = sorted(stats['durations'])
+                lines.append("%-60s %6d %6d %9.2f %8.0f %8.0f %8.0f %8.0f %10s %10s" % (
+                    name[:60], len(durations), stats['errors'], sum(durations),
+                    percentile(durations, 50) * 1000, percentile(durations, 90) * 1000, percentile(durations, 99) * 1000, durations[-1] * 1000,
+                    format_bytes(stats['sent']), format_bytes(stats['received'])))
+
+            lines.append("")
+            lines.append("%-60s %6s %9s" % ('Waiting', 'Times', 'Total (s)'))
+            for reason, stats in waits:
+                lines.append("%-60s %6d %9.2f" % (reason, stats['count'], stats['total']))
+
+            lines.append("")
+            lines.append("Requests: %d (%.2f s), waiting: %.2f s, total run time: %.2f s" % (
+                sum(len(s['durations']) for s in self.requests.values()),
+                sum(sum(s['durations']) for s in self.requests.values()),
+                sum(s['total'] for s in self.waits.values()),
+                time.time() - self.start))
+        return lines
+
+    def print_summary(self, out=None):
+        out = out or sys.stderr
+        print("", file=out)
+        print("Profile of the Galaxy API calls (concurrent requests and waits overlap)", file=out)
+        for line in self.summary():
+            print(line, file=out)
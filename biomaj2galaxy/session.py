@@ -0,0 +1,215 @@
+from __future__ import absolute_import
+from __future__ import division
+
+import email.utils
+import json
+import random
+import threading
+import time
+
+from bioblend import ConnectionError
+from bioblend import galaxy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from urllib3.util.retry import Retry
+
+# HTTP settings, which can be changed for each instance in the 'http' section of the config file
+DEFAULT_HTTP_SETTINGS = {
+    'pool_size': 8,  # Number of connections kept open to the server (should be at least --max-workers)
+    'connect_timeout': 10,  # In seconds
+    'read_timeout': 300,  # In seconds, some requests on big data tables or libraries can be slow
+    'retries': 3,  # Retries on connection errors and 429/502/503/504 responses (only 429 for POST requests)
+    'backoff_factor': 0.5,  # Delay before the nth retry: backoff_factor * 2^(n-1) seconds
+    'compression': True,  # Ask for gzip compressed responses
+    'max_in_flight': None,  # Maximum number of concurrent requests (default=pool_size)
+    'slow_request': 20,  # Requests longer than this (in seconds) are a sign of an overloaded server
+}
+
+# Methods that can be sent again safely (POST requests would launch the same job twice)
+RETRIED_METHODS = ['HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS']
+
+# Responses of an overloaded server
+OVERLOAD_STATUSES = [429, 502, 503, 504]
+
+
+def parse_retry_after(value):
+    """
+    Get the delay in seconds asked by a Retry-After header (a number of seconds or a date)
+    """
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, email.utils.mktime_tz(date) - time.time())
+
+
+class AdaptiveLimiter(object):
+    """
+    Limit the number of concurrent requests, adapting the limit to the server load (AIMD):
+    the limit grows slowly while responses are fast and successful, and is halved on errors, timeouts or slow responses.
+    Requests are also paused while the server asks to wait (Retry-After header)
+    """
+
+    def __init__(self, max_limit, slow_request=None):
+        self.max_limit = max(1, max_limit)
+        self.limit = float(self.max_limit)
+        self.slow_request = slow_request
+        self.in_flight = 0
+        self.paused_until = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                pause = self.paused_until - time.time()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+
+    def release(self, duration, overloaded=False, retry_after=None):
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded or (self.slow_request and duration > self.slow_request):
+                self.limit = max(1., self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1. / self.limit)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.time() + retry_after)
+            self._cond.notify_all()
+
+
+def get_http_settings(settings=None):
+    """
+    Complete a (partial) http settings dict with default values
+    """
+    full_settings = dict(DEFAULT_HTTP_SETTINGS)
+    if settings:
+        full_settings.update({k: v for k, v in settings.items() if v is not None})
+    return full_settings
+
+
+def make_session(settings):
+    """
+    Create a requests session keeping a pool of connections open, and retrying requests on connection errors
+    (responses of an overloaded server are retried by PooledGalaxyInstance)
+    """
+    try:
+        retry = Retry(total=settings['retries'], backoff_factor=settings['backoff_factor'], allowed_methods=RETRIED_METHODS, respect_retry_after_header=False)
+    except TypeError:
+        # urllib3 < 1.26
+        retry = Retry(total=settings['retries'], backoff_factor=settings['backoff_factor'], method_whitelist=RETRIED_METHODS, respect_retry_after_header=False)
+
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings['pool_size'], max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate' if settings['compression'] else 'identity'
+
+    return session
+
+
+class PooledGalaxyInstance(galaxy.GalaxyInstance):
+    """
+    A GalaxyInstance sending all its requests through a single requests session, and an adaptive limiter
+    """
+
+    def __init__(self, url, key, http=None):
+        self.http_settings = get_http_settings(http)
+        super(PooledGalaxyInstance, self).__init__(url=url, key=key)
+        self.timeout = (self.http_settings['connect_timeout'], self.http_settings['read_timeout'])
+        self.session = make_session(self.http_settings)
+        self.limiter = AdaptiveLimiter(self.http_settings['max_in_flight'] or self.http_settings['pool_size'], self.http_settings['slow_request'])
+        self.profiler = None  # See profiling.Profiler
+
+    def _request(self, method, url, **kwargs):
+        """
+        Send a request when the limiter allows it, retrying it while the server is overloaded
+        """
+        attempt = 0
+        while True:
+            start = time.time()
+            self.limiter.acquire()
+            if self.profiler and time.time() - start > 0.001:
+                self.profiler.record_wait('request limiter', time.time() - start)
+
+            start = time.time()
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.limiter.release(time.time() - start, overloaded=isinstance(e, (requests.ConnectionError, requests.Timeout)))
+                if self.profiler:
+                    self.profiler.record_request(method, url, time.time() - start, len(kwargs.get('data') or ''))
+                # Network errors and timeouts are reported like the other failed requests (status_code is None),
+                # bioblend only does it for the connection errors of GET requests
+                raise ConnectionError("%s request to %s failed: %s" % (method, url, e))
+            except Exception:
+                self.limiter.release(time.time() - start)
+                raise
+
+            overloaded = r.status_code in OVERLOAD_STATUSES
+            retry_after = parse_retry_after(r.headers.get('Retry-After')) if overloaded else None
+            self.limiter.release(time.time() - start, overloaded, retry_after)
+            if self.profiler:
+                self.profiler.record_request(method, url, time.time() - start, len(kwargs.get('data') or ''), len(r.content), r.status_code)
+
+            retriable = method in RETRIED_METHODS or r.status_code == 429  # 429: the request was not processed
+            if not overloaded or not retriable or attempt >= self.http_settings['retries']:
+                return r
+
+            if retry_after is None:
+                # Otherwise the limiter waits
+                delay = self.http_settings['backoff_factor'] * (2 ** attempt) * random.uniform(0.5, 1.5)
+                time.sleep(delay)
+                if self.profiler:
+                    self.profiler.record_wait('request retry', delay)
+            attempt += 1
+
+    def _decode(self, r):
+        """
+        Decode a response the same way as bioblend
+        """
+        if r.status_code == 200:
+            try:
+                return r.json()
+            except Exception as e:
+                raise ConnectionError("Request was successful, but cannot decode the response content: %s" % e, body=r.content, status_code=r.status_code)
+        raise ConnectionError("Unexpected HTTP status code: %s" % r.status_code, body=r.text, status_code=r.status_code)
+
+    def make_get_request(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('verify', self.verify)
+        return self._request('GET', url, headers=self.json_headers, **kwargs)
+
+    def make_post_request(self, url, payload=None, params=None, files_attached=False):
+        if files_attached:
+            # Multipart uploads are not used by biomaj2galaxy
+            return super(PooledGalaxyInstance, self).make_post_request(url, payload=payload, params=params, files_attached=files_attached)
+
+        data = json.dumps(payload) if payload is not None else None
+        r = self._request('POST', url, params=params, data=data, headers=self.json_headers, timeout=self.timeout, allow_redirects=False, verify=self.verify)
+        return self._decode(r)
+
+    def make_delete_request(self, url, payload=None, params=None):
+        data = json.dumps(payload) if payload is not None else None
+        return self._request('DELETE', url, params=params, data=data, headers=self.json_headers, timeout=self.timeout, allow_redirects=False, verify=self.verify)
+
+    def make_put_request(self, url, payload=None, params=None):
+        data = json.dumps(payload) if payload is not None else None
+        r = self._request('PUT', url, params=params, data=data, headers=self.json_headers, timeout=self.timeout, allow_redirects=False, verify=self.verify)
+        return self._decode(r)
+
+    def make_patch_request(self, url, payload=None, params=None):
+        data = json.dumps(payload) if payload is not None else None
+        r = self._request('PATCH', url, params=params, data=data, headers=self.json_headers, timeout=self.timeout, allow_redirects=False, verify=self.verify)
+        return self._decode(r)
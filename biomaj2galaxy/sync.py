@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import re
+
+from biomaj2galaxy.config import global_config_path
+from biomaj2galaxy.io import warn
+
+# Size of the blocks read at once when computing checksums
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sync_state_path(url, library_id):
+    """
+    Path to the file describing the last synchronization of a data library, next to the global config file
+    """
+    state_dir = os.path.join(os.path.dirname(global_config_path()), '.bm2g_sync')
+    return os.path.join(state_dir, re.sub('[^A-Za-z0-9.-]+', '_', '%s_%s' % (url, library_id)).strip('_') + '.json')
+
+
+def read_sync_state(gi, library_id):
+    """
+    Get the files synchronized the last time in a library.
+    Returns a dict mapping each path in the library to the description of the source file (see file_info()) and its 'dataset_id'
+    """
+    try:
+        with open(sync_state_path(gi.base_url, library_id)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def write_sync_state(gi, library_id, state):
+    state_path = sync_state_path(gi.base_url, library_id)
+    try:
+        if not os.path.isdir(os.path.dirname(state_path)):
+            os.makedirs(os.path.dirname(state_path))
+        tmp_path = "%s.%s.tmp" % (state_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.rename(tmp_path, state_path)
+    except (IOError, OSError) as e:
+        warn("Could not write the synchronization state '%s': %s" % (state_path, e))
+
+
+def file_hash(path):
+    """
+    Compute the md5 checksum of a file
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def file_info(path):
+    """
+    Describe a local file, to detect its modifications (see is_unchanged())
+    """
+    stat = os.stat(path)
+    return {'source': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': None}
+
+
+def is_unchanged(info, known, checksum=False):
+    """
+    Check if a file described by file_info() is the same as the one described by known.
+    The files are compared using their path, size and modification time, or using their checksum (computed if needed)
+    instead of the modification time if checksum is True and the checksum of the known file was recorded
+    """
+    if info['source'] != known.get('source') or info['size'] != known.get('size'):
+        return False
+
+    if not checksum or not known.get('hash'):
+        return info['mtime'] == known.get('mtime')
+
+    if not info['hash']:
+        info['hash'] = file_hash(info['source'])
+
+    return info['hash'] == known['hash']
@@ -3,14 +3,174 @@ from __future__ import division
 from __future__ import print_function
 
 import fnmatch
+import json
 import os
+import random
+import re
 import sys
 import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from bioblend import ConnectionError
-
+from biomaj2galaxy.config import DEFAULT_FS_WORKERS, DEFAULT_MAX_WORKERS, get_poll_policy, tables_cache_path
 from biomaj2galaxy.io import warn
 
+# bioblend is only imported by the functions catching its errors, once a Galaxy instance was created (see Context.gi)
+
+
+DEFAULT_CACHE_TTL = 86400
+DEFAULT_BATCH_SIZE = 100
+
+# Below this number of datasets in a history, their states are checked one by one instead of listing the history contents
+FEW_DATASETS = 3
+
+# Directory listings used to check the input files, see list_dir()
+_dir_listings = {}
+
+JOB_FINISHED_STATES = ['ok', 'error', 'failed', 'deleted', 'deleting', 'paused', 'skipped', 'stopped']
+DATASET_FINISHED_STATES = ['ok', 'error', 'failed_metadata', 'discarded', 'deferred', 'paused']
+
+
+def fetch_data_tables(gi, names=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Fetch the content of several data tables concurrently.
+    Returns a dict mapping each table name to its show_data_table() content, in the listing order
+    """
+    if names is None:
+        names = [t['name'] for t in gi.tool_data.get_data_tables()]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        contents = executor.map(gi.tool_data.show_data_table, names)
+        return dict(zip(names, contents))
+
+
+def read_tables_cache(gi, ttl):
+    """
+    Read the cached data tables format of the given Galaxy instance.
+    Returns None if there is no cache, or if it is older than ttl seconds
+    """
+    cache_path = tables_cache_path(gi.base_url)
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if cache.get('url') != gi.base_url or time.time() - cache.get('time', 0) > ttl:
+        return None
+
+    return cache['tables']
+
+
+def write_tables_cache(gi, tables_format):
+    """
+    Save the data tables format of the given Galaxy instance to the cache
+    """
+    cache_path = tables_cache_path(gi.base_url)
+    try:
+        if not os.path.isdir(os.path.dirname(cache_path)):
+            os.makedirs(os.path.dirname(cache_path))
+        tmp_path = "%s.%s.tmp" % (cache_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump({'url': gi.base_url, 'time': time.time(), 'tables': tables_format}, f)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError) as e:
+        warn("Could not write the data tables cache '%s': %s" % (cache_path, e))
+
+
+def get_tables_format(gi, max_workers=DEFAULT_MAX_WORKERS, cache_ttl=0, refresh=False, on_content=None):
+    """
+    Get the list of columns of each known data table.
+    The result is read from the local cache if it is younger than cache_ttl seconds (0 disables the cache),
+    unless refresh is True.
+    Otherwise the tables are downloaded concurrently, only keeping their columns: if given, on_content(name, content)
+    is called (from the worker threads) with the content of each table, to use it without downloading it again.
+    """
+    if cache_ttl > 0 and not refresh:
+        tables_format = read_tables_cache(gi, cache_ttl)
+        if tables_format is not None:
+            return tables_format
+
+    def fetch_format(name):
+        content = gi.tool_data.show_data_table(name)
+        if on_content:
+            on_content(name, content)
+        columns = content['columns']
+
+        # A stupid fix for the twobit table which for some unknown reason doesn't have a 'name' column_name
+        # As this 'name' column is required for a data table, the galaxy code adds a non-existing one when it is not found in the table defintion.
+        if name == 'twobit' and 'name' in columns:
+            columns = [c for c in columns if c != 'name']
+
+        return columns
+
+    names = [t['name'] for t in gi.tool_data.get_data_tables()]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        tables_format = dict(zip(names, executor.map(fetch_format, names)))
+
+    if cache_ttl > 0:
+        write_tables_cache(gi, tables_format)
+
+    return tables_format
+
+
+def index_rows(rows, field):
+    """
+    Index the rows of a data table on one of its columns, to find the rows of some dbkeys quickly (see match_rows()).
+    Returns the sorted column values, and the corresponding row numbers
+    """
+    pairs = sorted((row[field], i) for i, row in enumerate(rows) if len(row) > field)  # Sometimes Galaxy is lying (featurecounts_anno table)
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+
+def match_rows(index, patterns, exact=False, regex=False):
+    """
+    Find the rows matching some dbkeys in an index built by index_rows().
+    Each pattern is a dbkey or a glob pattern (or a regular expression if regex is True), matching all the values beginning
+    with it, or only the whole values if exact is True.
+    Returns the sorted list of matching row numbers
+    """
+    keys, row_numbers = index
+    found = set()
+    for pattern in patterns:
+        if regex:
+            # No usable sorting order: check each distinct value once
+            matcher = re.compile('(?:%s)\\Z' % pattern if exact else pattern).match
+            lo, hi = 0, len(keys)
+        elif any(c in pattern for c in '*?['):
+            matcher = partial(fnmatch.fnmatchcase, pat=pattern if exact else pattern + '*')
+            prefix = re.split(r'[*?\[]', pattern, 1)[0]
+            lo, hi = prefix_range(keys, prefix)
+        elif exact:
+            matcher = None
+            lo, hi = bisect_left(keys, pattern), bisect_right(keys, pattern)
+        else:
+            matcher = None
+            lo, hi = prefix_range(keys, pattern)
+
+        last_key = None
+        last_match = False
+        for j in range(lo, hi):
+            if keys[j] != last_key:
+                last_key = keys[j]
+                last_match = matcher is None or bool(matcher(last_key))
+            if last_match:
+                found.add(row_numbers[j])
+
+    return sorted(found)
+
+
+def prefix_range(keys, prefix):
+    """
+    Get the range of the sorted keys beginning with prefix
+    """
+    lo = bisect_left(keys, prefix)
+    hi = lo
+    while hi < len(keys) and keys[hi].startswith(prefix):
+        hi += 1
+    return lo, hi
+
 
 def get_roles(gi, roles):
     """
@@ -29,27 +189,64 @@ def get_roles(gi, roles):
     return ids
 
 
+def list_dir(path, refresh=False):
+    """
+    Get the sorted list of the names of the entries of a directory (empty if it can't be read).
+    Listings are kept for the whole run, unless refresh is True
+    """
+    if refresh or path not in _dir_listings:
+        try:
+            _dir_listings[path] = sorted(entry.name for entry in os.scandir(path))
+        except OSError:
+            _dir_listings[path] = []
+
+    return _dir_listings[path]
+
+
 def isfile_wo_ext(path):
     """Checks that a file exists, or exists with any extension"""
     path_dir = os.path.dirname(path)
     path_fn = os.path.basename(path)
 
-    return os.path.isfile(path) or len(fnmatch.filter(os.listdir(path_dir), path_fn + '.*')) > 0
+    for refresh in (False, True):
+        # A cached listing may be outdated: list the directory again before giving up
+        names = list_dir(path_dir, refresh)
+
+        i = bisect_left(names, path_fn)
+        if i < len(names) and names[i] == path_fn and os.path.isfile(path):
+            return True
 
+        i = bisect_left(names, path_fn + '.', i)
+        if i < len(names) and names[i].startswith(path_fn + '.'):
+            return True
 
-def check_input(sources, check_existence=True, use_biomaj_env=True):
+    return False
+
+
+def check_input(sources, check_existence=True, use_biomaj_env=True, allow_dirs=False, max_workers=DEFAULT_FS_WORKERS):
     formatted_source = []
-    print("Checking input files, converting to absolute path: %s" % sources)
+    print("Checking input files, converting to absolute path: %s" % list(sources))
     for f in sources:
         if use_biomaj_env and not f.startswith('/') and 'data.dir' in os.environ and 'dirversion' in os.environ and 'localrelease' in os.environ:
             abs_path = os.path.join(os.environ['data.dir'], os.environ['dirversion'], os.environ['localrelease'], f)
         else:
             abs_path = os.path.abspath(f)
 
-        if check_existence and not isfile_wo_ext(abs_path):
-            raise Exception("File '" + abs_path + "' could not be read!")
-
         formatted_source.append(abs_path)
+
+    if check_existence:
+        def exists(abs_path):
+            return (allow_dirs and os.path.isdir(abs_path)) or isfile_wo_ext(abs_path)
+
+        # Checks are slow on network file systems: run them concurrently, listing each directory once
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            list(executor.map(list_dir, set(os.path.dirname(f) for f in formatted_source)))
+            found = list(executor.map(exists, formatted_source))
+
+        for abs_path, ok in zip(formatted_source, found):
+            if not ok:
+                raise Exception("File '" + abs_path + "' could not be read!")
+
     return formatted_source
 
 
@@ -101,10 +298,11 @@ def find_tree(gi, found_lib, folders):
     return last_f_id
 
 
-def create_tree(gi, found_lib, folders):
+def create_trees(gi, found_lib, trees, max_workers=DEFAULT_MAX_WORKERS):
     """
-    Create a directory structure in the given library.
-    Returns the id of the last folder of the tree
+    Create several directory structures in the given library, given as lists of folder names.
+    Missing folders are created level by level, concurrently.
+    Returns a dict mapping each path (as a tuple of folder names, () being the root folder) to its folder id
     """
     dist_folders = gi.libraries.get_folders(found_lib)
 
@@ -112,94 +310,562 @@ def create_tree(gi, found_lib, folders):
     for f in dist_folders:
         dist_f[f['name']] = f
 
-    path = ""
-    last_f_id = None
-    folder_to_create = []
-    for f in folders:
-        path += "/" + f
-        if path in dist_f:
-            print("Found folder " + f)
-            last_f_id = dist_f[path]['id']
-        else:
-            print("Did not find folder " + f)
-            folder_to_create.append(f)
-
-    if len(folder_to_create) > 0:
-        for f in folder_to_create:
-            if last_f_id:
-                print("Creating folder " + f + " in folder " + last_f_id)
-                f_c = gi.libraries.create_folder(found_lib, f, "", last_f_id)
+    folder_ids = {(): dist_f['/']['id'] if '/' in dist_f else None}  # The root folder
+    folder_to_create = set()
+    for folders in trees:
+        for depth in range(1, len(folders) + 1):
+            path = tuple(folders[:depth])
+            if path in folder_ids or path in folder_to_create:
+                continue
+            if "/" + "/".join(path) in dist_f:
+                print("Found folder " + "/".join(path))
+                folder_ids[path] = dist_f["/" + "/".join(path)]['id']
             else:
-                print("Creating folder " + f + " in root folder")
-                f_c = gi.libraries.create_folder(found_lib, f, "")
-            last_f_id = f_c[0]['id']
+                print("Did not find folder " + "/".join(path))
+                folder_to_create.add(path)
+
+    def create_folder(path):
+        parent_id = folder_ids[path[:-1]]
+        if parent_id:
+            print("Creating folder " + path[-1] + " in folder " + parent_id)
+            f_c = gi.libraries.create_folder(found_lib, path[-1], "", parent_id)
+        else:
+            print("Creating folder " + path[-1] + " in root folder")
+            f_c = gi.libraries.create_folder(found_lib, path[-1], "")
+        return f_c[0]['id']
 
-    return last_f_id
+    # The parents of each level are known once the previous one is created
+    for depth in sorted(set(len(path) for path in folder_to_create)):
+        level = sorted(path for path in folder_to_create if len(path) == depth)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            folder_ids.update(zip(level, executor.map(create_folder, level)))
+
+    return folder_ids
+
+
+def list_tree(source):
+    """
+    List the files of a local directory recursively.
+    Returns a dict mapping each subdirectory (as a tuple of directory names, () being the source directory) to the
+    sorted list of the files it contains.
+    Symbolic links to directories are not followed (they can point to a parent directory, e.g. 'current' in BioMAJ banks)
+    """
+    tree = {}
+    to_scan = [()]
+    while to_scan:
+        rel_path = to_scan.pop()
+        files = []
+        for entry in os.scandir(os.path.join(source, *rel_path)):
+            if entry.is_dir(follow_symlinks=False):
+                to_scan.append(rel_path + (entry.name,))
+            elif entry.is_file():
+                files.append(entry.path)
+            elif entry.is_dir():
+                warn("Skipping symbolic link to a directory '%s'" % entry.path)
+        tree[rel_path] = sorted(files)
+
+    return tree
+
+
+def sources_by_folder(sources, dest, recursive=True):
+    """
+    Place local files and directories in a data library folder (dest, as a tuple of folder names): files are put in dest,
+    and directories (if recursive) in a subfolder of dest with the same name, reproducing their tree of subdirectories.
+    Returns a dict mapping each folder path (as a tuple of folder names) to the list of files to put in it
+    """
+    files_by_folder = {dest: []}
+    dirs = {}
+    for source in sources:
+        if recursive and os.path.isdir(source):
+            base = dest + (os.path.basename(os.path.normpath(source)),)
+            if base in dirs:
+                raise Exception("Several directories would have the same path '/%s' in the library: %s, %s" % ("/".join(base), dirs[base], source))
+            dirs[base] = source
+            for sub_path, files in list_tree(source).items():
+                files_by_folder.setdefault(base + sub_path, []).extend(files)
+        else:
+            files_by_folder[dest].append(source)
+
+    for path, files in files_by_folder.items():
+        names = {}
+        for f in files:
+            names.setdefault(os.path.basename(f), []).append(f)
+        for name, same_name in names.items():
+            if len(same_name) > 1:
+                raise Exception("Several files would have the same path '/%s' in the library: %s" % ("/".join(path + (name,)), ", ".join(same_name)))
+
+    return files_by_folder
+
+
+def add_files(gi, lib, dest_folder, source, roles, file_type, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Add files to a library folder, uploading batch_size files per request.
+    Returns the list of created library datasets
+    """
+    uploaded = []
+    batch_size = max(1, batch_size)
+    batches = [source[i:i + batch_size] for i in range(0, len(source), batch_size)]
+    for num, batch in enumerate(batches):
+        start = time.time()
+        uploaded += gi.libraries.upload_from_galaxy_filesystem(lib, "\n".join(batch), dest_folder, file_type, link_data_only='link_to_files')
+        if len(batches) > 1:
+            print("Uploaded batch %s/%s (%s file(s)) in %.1fs" % (num + 1, len(batches), len(batch), time.time() - start))
+
+    if roles and batches:
+        gi.libraries.set_library_permissions(lib, access_in=roles)
+
+    return uploaded
 
 
-def add_files(gi, lib, dest_folder, source, roles, file_type):
-    for f in source:
-        gi.libraries.upload_from_galaxy_filesystem(lib, f, dest_folder, file_type, link_data_only='link_to_files')
-        if roles:
-            gi.libraries.set_library_permissions(lib, access_in=roles)
+def get_folder_contents(gi, folder_id, page_size=1000):
+    """
+    Get the list of all items in a library folder, fetched by pages
+    """
+    try:
+        content = gi.folders.show_folder(folder_id, contents=True, limit=page_size, offset=0)
+    except TypeError:
+        # Older bioblend versions don't paginate
+        return gi.folders.show_folder(folder_id, contents=True)['folder_contents']
+
+    items = content['folder_contents']
+    total = content.get('metadata', {}).get('total_rows', len(items))
+    while len(items) < total:
+        page = gi.folders.show_folder(folder_id, contents=True, limit=page_size, offset=len(items))['folder_contents']
+        if not page:
+            break
+        items += page
 
+    return items
 
-def check_existing(gi, lib, dest, source, replace):
 
+def check_existing(gi, lib, dest, source, replace, folder_id=None):
+    """
+    Look for the source files in the dest library folder (its id can be given as folder_id), and remove them if replace is True
+    """
     dest = "/" + "/".join(dest)
-    files = []
-    for f in source:
-        files.append(dest + "/" + os.path.basename(f))
+    files = set(os.path.basename(f) for f in source)
+
+    if folder_id is None:
+        folders = {f['name']: f['id'] for f in gi.libraries.get_folders(lib)}
+        if dest not in folders:
+            return
+        folder_id = folders[dest]
 
-    libs = gi.libraries.show_library(lib, True)
-    for e in libs:
+    for e in get_folder_contents(gi, folder_id):
         if e['type'] == 'file' and e['name'] in files:
+            name = dest.rstrip('/') + "/" + e['name']
             if replace:
-                print(e['name'] + " already present in the data library: replacing it")
+                print(name + " already present in the data library: replacing it")
                 gi.libraries.delete_library_dataset(lib, e['id'])
             else:
-                print(e['name'] + " already present in the data library: adding another copy")
+                print(name + " already present in the data library: adding another copy")
 
 
-def get_dbkey_entry(gi, dbkey):
+def get_job_item(run_res, name=None):
+    """
+    Get the ids to follow a job launched with gi.tools.run_tool(), in the format used by get_states() and wait_all()
+    """
+    item = {
+        'dataset_id': run_res['outputs'][0]['id'],
+        'history_id': run_res['outputs'][0].get('history_id'),
+        'job_id': None,
+        'name': name,
+    }
+    if 'jobs' in run_res:
+        item['job_id'] = run_res['jobs'][0]['id']
+
+    return item
+
+
+def run_job(gi, tool_id, params, name=None):
+    """
+    Launch a tool, and return the ids to follow its job (see get_job_item())
+    """
+    return get_job_item(gi.tools.run_tool(None, tool_id, params), name)
+
+
+def submit_step(gi, step):
+    """
+    Launch the job of a step (see run_steps()), and return the ids to follow it
+    """
+    item = run_job(gi, step['job']['tool_id'], step['job']['params'], step['job'].get('name'))
+    item['step'] = step['name']
+    return item
+
+
+def start_steps(gi, steps, done=()):
+    """
+    Launch the steps depending only on already finished steps (named in done), without waiting.
+    Returns the list of launched jobs, and the list of steps still waiting for other ones
+    (they can be recorded in the journal, and launched later by calling this function again).
+    """
+    launched = []
+    waiting = []
+    for step in steps:
+        if set(step.get('depends', [])) <= set(done):
+            launched.append(submit_step(gi, step))
+        else:
+            waiting.append(step)
+    return launched, waiting
+
+
+def get_job_states(gi, items):
+    """
+    Get the current state of launched jobs, using the lightweight job state when the job id is known,
+    and the state of the output dataset otherwise (see get_states()).
+    Returns a dict mapping dataset ids to a (state, finished) tuple
+    """
+    states = {}
+    for item in items:
+        if item.get('job_id') is not None:
+            state = gi.jobs.get_state(item['job_id'])
+            states[item['dataset_id']] = (state, state in JOB_FINISHED_STATES)
+
+    others = [item for item in items if item.get('job_id') is None]
+    if others:
+        for dataset_id, state in get_states(gi, others).items():
+            states[dataset_id] = (state, state in DATASET_FINISHED_STATES)
+
+    return states
+
+
+def run_steps(gi, steps, poll_policy=None):
+    """
+    Launch jobs as soon as the jobs they depend on are finished, and wait for all of them.
+    Each step is a dict with a 'name', a 'job' dict with the 'tool_id', 'params' and 'name' of the job to launch (see run_job()),
+    and a list of step names it 'depends' on.
+    Returns the list of launched jobs
+    """
+    from bioblend import ConnectionError
+
+    names = [step['name'] for step in steps]
+    for step in steps:
+        for dep in step.get('depends', []):
+            if dep not in names:
+                raise Exception("Step '%s' depends on unknown step '%s'" % (step['name'], dep))
+
+    submitted = []
+    done = set()
+    running = {}
+    error_number = 0
+    intervals = poll_intervals(poll_policy)
+    while len(done) < len(steps):
+        for step in steps:
+            if step['name'] not in done and step['name'] not in running and set(step.get('depends', [])) <= done:
+                running[step['name']] = submit_step(gi, step)
+                submitted.append(running[step['name']])
+                intervals = poll_intervals(poll_policy)  # Check new jobs early
+
+        if not running:
+            raise Exception("Circular dependency between steps %s" % [s['name'] for s in steps if s['name'] not in done])
+
+        pause(gi, next(intervals), 'run_steps')
+
+        try:
+            states = get_job_states(gi, list(running.values()))
+            error_number = 0
+        except ConnectionError as e:
+            if not is_transient(e):
+                raise
+            error_number += 1
+            warn("Could not connect to the Galaxy server, retrying...")
+
+            if error_number > 50:
+                raise Exception('Could not connect to the Galaxy server for too long, giving up.')
+            continue
+
+        for name, item in list(running.items()):
+            state, finished = states.get(item['dataset_id'], (None, False))
+            if not finished:
+                continue
+
+            if state != 'ok':
+                # Let wait_completion() report the error
+                wait_completion(gi, item['dataset_id'], item['job_id'], poll_policy=poll_policy)
+                raise Exception("Job finished in '%s' state: %s! Aborting" % (state, item.get('name') or name))
+
+            print("Job finished: %s" % (item.get('name') or name))
+            done.add(name)
+            del running[name]
+
+    return submitted
+
+
+def get_states(gi, items):
+    """
+    Get the current state of many datasets, using a single request per history or library folder.
+    Items are dicts with a 'dataset_id' and either a 'history_id' or a 'library_id' and a 'folder_id'.
+    Returns a dict mapping dataset ids to their state
+    """
+    states = {}
+
+    by_container = {}
+    for item in items:
+        if item.get('folder_id'):
+            key = ('folder', item['folder_id'])
+        elif item.get('history_id'):
+            key = ('history', item['history_id'])
+        else:
+            key = ('dataset', item['dataset_id'])
+        by_container.setdefault(key, []).append(item)
+
+    for (kind, container_id), container_items in by_container.items():
+        if kind == 'history' and len(container_items) <= FEW_DATASETS:
+            # Cheaper than listing a possibly big history
+            contents = [gi.datasets.show_dataset(item['dataset_id']) for item in container_items]
+        elif kind == 'history':
+            contents = gi.histories.show_history(container_id, contents=True)
+        elif kind == 'folder':
+            contents = get_folder_contents(gi, container_id)
+        else:
+            contents = [gi.datasets.show_dataset(container_id)]
+
+        found = {c['id']: c.get('state') for c in contents}
+        for item in container_items:
+            state = found.get(item['dataset_id'])
+            if state is None and kind == 'folder':
+                # Some Galaxy versions don't give the state in folder contents
+                state = gi.libraries.show_dataset(item['library_id'], item['dataset_id']).get('state')
+            states[item['dataset_id']] = state
+
+    return states
+
+
+def wait_all(gi, items, exit_on_error=True, poll_policy=None):
+    """
+    Wait for many datasets to be ready, checking the state of all of them at once at each tick (see get_states()).
+    Returns a dict mapping dataset ids to their final state.
+    """
+    from bioblend import ConnectionError
+
+    error_number = 0
+    intervals = poll_intervals(poll_policy)
+
+    pending = list(items)
+    states = {}
+    last_report = None
+    while pending:
+        try:
+            current = get_states(gi, pending)
+            error_number = 0
+        except ConnectionError as e:
+            if not is_transient(e):
+                raise
+            error_number += 1
+            warn("Could not connect to the Galaxy server, retrying...")
+            current = {}
+
+            if error_number > 50:
+                raise Exception('Could not connect to the Galaxy server for too long, giving up.')
+
+        still_pending = []
+        for item in pending:
+            state = current.get(item['dataset_id'])
+            if state in DATASET_FINISHED_STATES:
+                states[item['dataset_id']] = state
+            else:
+                still_pending.append(item)
+        pending = still_pending
+
+        report = (len(states), len(items))
+        if report != last_report:
+            print("%s/%s dataset(s) ready" % report)
+            last_report = report
+
+        # Not finished yet, wait a little
+        if pending:
+            pause(gi, next(intervals), 'wait_all')
+
+    failed = [item for item in items if states[item['dataset_id']] != 'ok']
+    if exit_on_error and failed:
+        for item in failed:
+            print("Dataset '%s' finished in '%s' state" % (item.get('name', item['dataset_id']), states[item['dataset_id']]), file=sys.stderr)
+        if failed[0].get('job_id'):
+            details = gi.jobs.show_job(failed[0]['job_id'], full_details=True)
+            print("STDOUT content:")
+            print(details['stdout'])
+            print("STDERR content:", file=sys.stderr)
+            print(details['stderr'], file=sys.stderr)
+        raise Exception("%s job(s) finished in error state! Aborting" % len(failed))
+
+    return states
+
+
+def reload_tables(gi, tables, max_workers=DEFAULT_MAX_WORKERS, attempts=5, poll_policy=None):
+    """
+    Reload data tables concurrently, checking that the expected rows are (or are no longer) in them.
+    tables is a list of table names, or a dict mapping table names to dicts with optional 'present' and 'absent' lists of rows.
+    Tables not containing the expected rows are reloaded again, up to attempts times.
+    Returns the list of tables that could not be verified
+    """
+    from bioblend import ConnectionError
+
+    if not isinstance(tables, dict):
+        tables = {t: {} for t in tables}
+
+    def reload_table(table):
+        print("Reloading table '%s'" % table)
+        try:
+            content = gi.tool_data.reload_data_table(table)
+        except ConnectionError as e:
+            warn("Failed to reload table '%s': %s" % (table, e))
+            return False
+
+        if not content or 'fields' not in content:
+            return True
+
+        fields = [list(f) for f in content['fields']]
+        present = all(list(row) in fields for row in tables[table].get('present', []))
+        absent = all(list(row) not in fields for row in tables[table].get('absent', []))
+        return present and absent
+
+    intervals = poll_intervals(poll_policy)
+    pending = list(tables.keys())
+    for attempt in range(attempts):
+        if attempt > 0:
+            pause(gi, next(intervals), 'reload_tables')
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            verified = list(executor.map(reload_table, pending))
+        pending = [t for t, ok in zip(pending, verified) if not ok]
+
+        if not pending:
+            break
+
+    for table in pending:
+        warn("Table '%s' does not contain the expected entries after reloading it %s times" % (table, attempts))
+
+    return pending
+
+
+def is_transient(error):
+    """
+    Check if a failed request is worth retrying (network error, server error or rate limiting)
+    """
+    status_code = getattr(error, 'status_code', None)
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def delete_rows(gi, rows, max_workers=DEFAULT_MAX_WORKERS, attempts=5, poll_policy=None):
+    """
+    Delete rows from data tables, with one table per worker: the rows of a table are deleted one after the other,
+    in the given order, as each deletion rewrites the table files.
+    Transient errors are retried up to attempts times.
+    rows is a list of (table name, row) tuples.
+    Returns two dicts mapping table names to the list of deleted rows, and to the list of rows that could not be deleted
+    """
+    from bioblend import ConnectionError
+
+    by_table = {}
+    for table, row in rows:
+        by_table.setdefault(table, []).append(row)
+
+    def delete_table_rows(table):
+        deleted = []
+        failed = []
+        for row in by_table[table]:
+            intervals = poll_intervals(poll_policy)
+            for attempt in range(attempts):
+                try:
+                    gi.tool_data.delete_data_table(table, "\t".join(row))
+                    deleted.append(row)
+                    break
+                except ConnectionError as e:
+                    if not is_transient(e) or attempt == attempts - 1:
+                        warn("Failed to delete '%s' from table '%s': %s" % ("', '".join(row), table, e))
+                        failed.append(row)
+                        break
+                    pause(gi, next(intervals), 'delete_rows')
+        return deleted, failed
+
+    tables = list(by_table.keys())
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(delete_table_rows, tables))
+
+    deleted = {}
+    failed = {}
+    for table, (table_deleted, table_failed) in zip(tables, results):
+        print("Deleted %s row(s) from table '%s'%s" % (len(table_deleted), table, ", %s failed" % len(table_failed) if table_failed else ''))
+        if table_deleted:
+            deleted[table] = table_deleted
+        if table_failed:
+            failed[table] = table_failed
+
+    return deleted, failed
+
+
+def get_dbkey_entries(gi):
+    """
+    Get all the rows of the __dbkeys__ table, indexed by dbkey
+    """
     dbkeys = gi.tool_data.show_data_table('__dbkeys__')
 
-    for k in dbkeys['fields']:
-        if k[0] == dbkey:
-            return k
+    return {k[0]: k for k in dbkeys['fields']}
+
+
+def pause(gi, seconds, reason):
+    """
+    Sleep, recording the time spent waiting when profiling (see --profile)
+    """
+    time.sleep(seconds)
+    profiler = getattr(gi, 'profiler', None)
+    if profiler:
+        profiler.record_wait(reason, seconds)
+
+
+def poll_intervals(policy=None):
+    """
+    Generate the successive delays to wait between two checks, following an exponential backoff with jitter
+    """
+    policy = get_poll_policy(policy)
+    interval = policy['min_interval']
+    while True:
+        yield interval * random.uniform(1 - policy['jitter'], 1 + policy['jitter'])
+        interval = min(interval * policy['factor'], policy['max_interval'])
+
 
+def wait_completion(gi, dataset_id, job_id, exit_on_error=True, poll_policy=None):
+    """
+    Wait for a job to finish, checking its state more and more rarely.
+    The (lightweight) job state is checked when the job id is known, the dataset state otherwise.
+    Returns the final state.
+    """
+    from bioblend import ConnectionError
 
-def wait_completion(gi, dataset_id, job_id, sleep_time=30, exit_on_error=True):
     error_number = 0
-    sleep_time = 10  # Don't wait too much for first try
+    intervals = poll_intervals(poll_policy)
 
-    dataset_info = []
+    status = None
     while True:
         # What's the status of the running job?
         try:
-            dataset_info = gi.datasets.show_dataset(dataset_id)
-        except ConnectionError:
+            if job_id is not None:
+                status = gi.jobs.get_state(job_id)
+            else:
+                status = gi.datasets.show_dataset(dataset_id).get('state')
+            error_number = 0
+        except ConnectionError as e:
+            if not is_transient(e):
+                raise
             error_number += 1
-            warn("Could not connect to the Galaxy server, waiting %s seconds before retrying..." % (sleep_time * error_number))
-            time.sleep(sleep_time * (error_number - 1))  # -1 because we already wait a little below
+            warn("Could not connect to the Galaxy server, retrying...")
 
             if error_number > 50:
                 raise Exception('Could not connect to the Galaxy server for too long, giving up.')
 
         # Finished!
-        if dataset_info and 'state' in dataset_info and dataset_info['state'] in ['ok', 'error']:
+        if status in (JOB_FINISHED_STATES if job_id is not None else DATASET_FINISHED_STATES):
             break
 
         # Not finished yet, wait a little
-        time.sleep(sleep_time)
-        sleep_time = 30
+        pause(gi, next(intervals), 'wait_completion')
 
-    dataset_info = gi.datasets.show_dataset(dataset_id)
-    status = dataset_info['state']
-    if exit_on_error and status == 'error' and job_id is not None:
+    if exit_on_error and status != 'ok' and job_id is not None:
         details = gi.jobs.show_job(job_id, full_details=True)
         print("STDOUT content:")
         print(details['stdout'])
         print("STDERR content:", file=sys.stderr)
         print(details['stderr'], file=sys.stderr)
         raise Exception("Job finished in error state! Aborting")
+
+    return status
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Measure the startup time of biomaj2galaxy, using `python -X importtime` (Python >= 3.7).
+
+For each command line, the slowest imports are listed, and the script fails if a module that should only be
+imported when connecting to Galaxy (see SLOW_MODULES) was imported.
+
+Usage: python scripts/bench_startup.py [--runs N] [--top N]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Command lines that should not need to connect to Galaxy
+COMMAND_LINES = [
+    ['--version'],
+    ['--help'],
+    ['add', '--help'],
+    ['add-lib', '--help'],
+    ['init', '--help'],
+]
+
+# Modules that should only be imported when a Galaxy instance is created
+SLOW_MODULES = ['bioblend', 'bioblend.galaxy', 'requests', 'requests_toolbelt']
+
+RUNNER = "import sys; from biomaj2galaxy.cli import biomaj2galaxy; sys.argv = ['biomaj2galaxy'] + sys.argv[1:]; biomaj2galaxy()"
+
+
+def run(args, importtime=False):
+    """
+    Run biomaj2galaxy with the given arguments.
+    Returns the wall clock time, and the stderr output
+    """
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', RUNNER] + args
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    start = time.time()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    stderr = proc.communicate()[1]
+    return time.time() - start, stderr.decode('utf-8', 'replace')
+
+
+def parse_importtime(output):
+    """
+    Parse the output of `python -X importtime`.
+    Returns a list of (module name, cumulative time in microseconds, nesting level) tuples
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2  # Top level imports are indented by one space
+        imports.append((name.strip(), int(cumulative_us), level))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="Number of runs for each command line (the best time is kept)")
+    parser.add_argument('--top', type=int, default=10, help="Number of slowest imports to show")
+    args = parser.parse_args()
+
+    failed = False
+    for command_line in COMMAND_LINES:
+        wall_time = min(run(command_line)[0] for i in range(args.runs))
+        imports = parse_importtime(run(command_line, importtime=True)[1])
+        total = sum(cumulative for name, cumulative, level in imports if level == 0)
+
+        print("biomaj2galaxy %s: %.0f ms (imports: %.0f ms)" % (' '.join(command_line), wall_time * 1000, total / 1000.))
+        for name, cumulative, level in sorted(imports, key=lambda i: -i[1])[:args.top]:
+            print("    %8.1f ms  %s" % (cumulative / 1000., name))
+
+        slow = sorted(set(name for name, cumulative, level in imports if name in SLOW_MODULES))
+        if slow:
+            print("    ERROR: imported %s" % ', '.join(slow))
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import os
+import unittest
+
+from biomaj2galaxy.commands.add import diff_rows, read_manifest
+from biomaj2galaxy.journal import read_journal
+
+from .fake_galaxy import ConfigDirTestCase, FakeGalaxy, run_command
+
+
+class AddTest(unittest.TestCase):
+
+    tables_format = {
+        'blastdb': ['value', 'name', 'path'],
+        'bowtie2_indexes': ['value', 'dbkey', 'name', 'path'],
+    }
+
+    uuids = ['11111111-1111-1111-1111-111111111111', '22222222-2222-2222-2222-222222222222', '33333333-3333-3333-3333-333333333333']
+
+    def test_diff_rows_id(self):
+
+        current = {'bowtie2_indexes': {'fields': [['hg19', 'hg19', 'Human', '/old'], ['mm10', 'mm10', 'Mouse', '/mm10']]}}
+        rows = [('bowtie2_indexes', ['hg19', 'hg19', 'Human', '/new']), ('bowtie2_indexes', ['mm10', 'mm10', 'Mouse', '/mm10'])]
+
+        to_add, to_delete = diff_rows(rows, self.tables_format, current)
+        assert to_add == [('bowtie2_indexes', ['hg19', 'hg19', 'Human', '/new'])]
+        assert to_delete == [('bowtie2_indexes', ['hg19', 'hg19', 'Human', '/old'])]
+
+    def test_diff_rows_generated(self):
+
+        old = [
+            ['hg19_%s' % self.uuids[0], 'Human', '/v1/proteins'],
+            ['hg19_%s' % self.uuids[1], 'Human', '/v1/genome'],
+            ['hg19_%s' % self.uuids[2], 'Other name', '/v1/other'],
+            ['mm10_%s' % self.uuids[0], 'Human', '/v1/proteins'],
+        ]
+        current = {'blastdb': {'fields': [list(row) for row in old]}}
+
+        # New release: all the entries with the same dbkey and name are replaced
+        rows = [('blastdb', ['hg19_%s' % self.uuids[2], 'Human', '/v2/proteins']), ('blastdb', ['hg19_%s' % self.uuids[1], 'Human', '/v2/genome'])]
+        to_add, to_delete = diff_rows(rows, self.tables_format, current)
+        assert to_add == rows
+        assert to_delete == [('blastdb', old[0]), ('blastdb', old[1])]
+
+        # Same files again: nothing to do, even with new generated ids
+        rows = [('blastdb', ['hg19_%s' % self.uuids[2], 'Human', '/v1/proteins']), ('blastdb', ['hg19_%s' % self.uuids[0], 'Human', '/v1/genome'])]
+        to_add, to_delete = diff_rows(rows, self.tables_format, current)
+        assert to_add == []
+        assert to_delete == []
+
+        # One file changed
+        rows = [('blastdb', ['hg19_%s' % self.uuids[2], 'Human', '/v1/proteins']), ('blastdb', ['hg19_%s' % self.uuids[0], 'Human', '/v2/genome'])]
+        to_add, to_delete = diff_rows(rows, self.tables_format, current)
+        assert to_add == [rows[1]]
+        assert to_delete == [('blastdb', old[1])]
+
+
+def fake_galaxy():
+    return FakeGalaxy(tables={
+        '__dbkeys__': {'columns': ['value', 'name', 'len_path'], 'fields': [['hg19', 'Human', '/hg19.len']]},
+        'blastdb': {'columns': ['value', 'name', 'path'], 'fields': [['hg19', 'Human', '/v1/blast']]},
+        'bowtie2_indexes': {'columns': ['value', 'dbkey', 'name', 'path'], 'fields': [['hg19', 'hg19', 'Human', '/v1/bowtie2']]},
+    })
+
+
+class AddCommandTest(ConfigDirTestCase):
+
+    args = ['add', '--no-file-check', '-d', 'hg19', '-n', 'Human', 'blastdb:/v2/blast', 'bowtie2:/v1/bowtie2']
+
+    def test_replace(self):
+
+        gi = fake_galaxy()
+        result = run_command(gi, self.args)
+        assert result.exit_code == 0
+
+        # The old entry is deleted once the new one is added, the unchanged one is not added again
+        assert gi.tables['blastdb']['fields'] == [['hg19', 'Human', '/v2/blast']]
+        assert gi.tables['bowtie2_indexes']['fields'] == [['hg19', 'hg19', 'Human', '/v1/bowtie2']]
+        assert gi.calls.index('delete_data_table:blastdb:hg19\tHuman\t/v1/blast') > gi.calls.index('run_tool:data_manager_manual')
+        assert "Adding a new entry to table 'blastdb': 'Human' -> '/v2/blast'" in result.output
+        assert "Adding a new entry to table 'bowtie2_indexes'" not in result.output
+
+    def test_replace_failed_job(self):
+
+        gi = fake_galaxy()
+        gi.tool_states['data_manager_manual'] = ['running', 'error']
+        result = run_command(gi, self.args)
+        assert result.exit_code != 0
+
+        # The old entry is kept
+        assert gi.tables['blastdb']['fields'] == [['hg19', 'Human', '/v1/blast']]
+        assert not [c for c in gi.calls if c.startswith('delete_data_table')]
+
+    def test_replace_no_wait(self):
+
+        gi = fake_galaxy()
+        result = run_command(gi, self.args + ['--no-wait'])
+        assert result.exit_code == 0
+
+        # The old entry is deleted by finalize, once the job is finished
+        assert not [c for c in gi.calls if c.startswith('delete_data_table')]
+        assert read_journal(gi)[0]['old_rows'] == [['blastdb', ['hg19', 'Human', '/v1/blast']]]
+
+        result = run_command(gi, ['finalize'])
+        assert "still running" in result.output
+        assert gi.tables['blastdb']['fields'] == [['hg19', 'Human', '/v1/blast'], ['hg19', 'Human', '/v2/blast']]
+
+        result = run_command(gi, ['finalize'])
+        assert result.exit_code == 0
+        assert gi.tables['blastdb']['fields'] == [['hg19', 'Human', '/v2/blast']]
+        assert read_journal(gi) == []
+
+    def test_replace_no_wait_failed_job(self):
+
+        gi = fake_galaxy()
+        gi.tool_states['data_manager_manual'] = ['error']
+        run_command(gi, self.args + ['--no-wait'])
+
+        result = run_command(gi, ['finalize', '--discard-failed'])
+        assert result.exit_code != 0
+        assert gi.tables['blastdb']['fields'] == [['hg19', 'Human', '/v1/blast']]
+        assert not [c for c in gi.calls if c.startswith('delete_data_table')]
+
+    def test_manifest(self):
+
+        manifest = os.path.join(self.tmp_dir, 'manifest.tsv')
+        with open(manifest, 'w') as f:
+            f.write("hg19\t\tbowtie2:/bowtie2/hg19\nmm10\t\tbowtie2:/bowtie2/mm10\n")
+
+        # The BioMAJ env variables are the same for all the dbkeys: they are not used
+        gi = fake_galaxy()
+        os.environ.update({'dbname': 'genomes', 'remoterelease': '2026-10'})
+        try:
+            result = run_command(gi, ['add', '--no-file-check', '--manifest', manifest])
+        finally:
+            del os.environ['dbname']
+            del os.environ['remoterelease']
+        assert result.exit_code == 0
+
+        assert gi.tables['__dbkeys__']['fields'] == [['hg19', 'Human', '/hg19.len'], ['mm10', 'mm10', '']]
+        assert gi.tables['bowtie2_indexes']['fields'] == [['hg19', 'hg19', 'Human', '/bowtie2/hg19'], ['mm10', 'mm10', 'mm10', '/bowtie2/mm10']]
+
+    def test_manifest_duplicates(self):
+
+        manifest = os.path.join(self.tmp_dir, 'manifest.yml')
+        with open(manifest, 'w') as f:
+            f.write("- dbkey: hg19\n  files: ['bowtie2:/bowtie2/a']\n- dbkey: hg19\n  name: Human\n  files: ['bowtie2:/bowtie2/b']\n- dbkey: mm10\n")
+
+        assert read_manifest(manifest) == [
+            {'dbkey': 'hg19', 'name': 'Human', 'files': ['bowtie2:/bowtie2/a', 'bowtie2:/bowtie2/b']},
+            {'dbkey': 'mm10', 'name': None, 'files': []},
+        ]
@@ -0,0 +1,51 @@
+import unittest
+
+from biomaj2galaxy.cache import CachedGalaxyInstance
+
+from .fake_galaxy import FakeGalaxy
+
+
+def fake_galaxy():
+    gi = FakeGalaxy()
+    gi.add_library('lib')
+    gi.add_library('other')
+    gi.roles_ids = {'role': 'r1'}
+    return gi
+
+
+class CacheTest(unittest.TestCase):
+
+    def test_cached_reads(self):
+
+        gi = CachedGalaxyInstance(fake_galaxy())
+
+        for i in range(3):
+            assert gi.libraries.get_libraries()[0]['id'] == 'l1'
+            assert gi.libraries.get_folders('l1')[0]['id'] == 'f1'
+            assert gi.roles.get_roles()[0]['id'] == 'r1'
+
+        assert gi.calls == ['get_libraries', 'get_folders:l1', 'get_roles']
+        assert gi.base_url == 'http://localhost'
+
+    def test_cached_copies(self):
+
+        gi = CachedGalaxyInstance(fake_galaxy())
+
+        gi.libraries.get_libraries()[0]['name'] = 'changed'
+        assert gi.libraries.get_libraries()[0]['name'] == 'lib'
+
+    def test_invalidation(self):
+
+        gi = CachedGalaxyInstance(fake_galaxy())
+
+        gi.libraries.get_folders('l1')
+        gi.libraries.get_folders('l2')
+        gi.libraries.create_folder('l1', 'new')
+        gi.libraries.get_folders('l1')
+        gi.libraries.get_folders('l2')
+        assert gi.calls == ['get_folders:l1', 'get_folders:l2', 'create_folder:l1:new', 'get_folders:l1']
+
+        del gi.calls[:]
+        gi.folders.delete_folder('f1')
+        gi.libraries.get_folders('l1')
+        assert gi.calls == ['delete_folder:f1', 'get_folders:l1']
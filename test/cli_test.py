@@ -0,0 +1,15 @@
+import importlib
+import unittest
+
+from biomaj2galaxy.cli import COMMANDS
+
+
+class CliTest(unittest.TestCase):
+
+    def test_commands_help(self):
+
+        # The short help listed by `biomaj2galaxy --help` is the beginning of the help of each command
+        for name, (path, short_help) in COMMANDS.items():
+            module_name, func_name = path.split(':')
+            command = getattr(importlib.import_module(module_name), func_name)
+            assert command.help.startswith(short_help.rstrip('.')), name
@@ -1,5 +1,6 @@
 import logging
 import os
+import tempfile
 import time
 import unittest
 
@@ -177,6 +178,63 @@ class DmTest(unittest.TestCase):
 
         os.environ = back_env
 
+    def test_add_twice(self):
+
+        new_dbkey = 'test_dbkey'
+        new_dbkey_name = 'My cool dbkey'
+
+        runner = CliRunner()
+        for i in range(2):
+            runner.invoke(biomaj2galaxy, ['add', '--dbkey', new_dbkey, '--dbkey-display-name', new_dbkey_name, '--no-file-check', 'bowtie2:/some/path/foo/bar', 'blastdb:/foo/really/other/path/foo/bar:With a cool name too!', 'blastdb:/foo/really/other/xxxx/bar:Wisuith a cool name too!'], catch_exceptions=False)
+
+        bowtie2 = self.gi.tool_data.show_data_table('bowtie2_indexes')
+        bowtie2 = bowtie2['fields']
+        assert bowtie2 == [[new_dbkey, new_dbkey, new_dbkey_name, '/some/path/foo/bar']]
+
+        blastdb = self.gi.tool_data.show_data_table('blastdb')
+        blastdb = blastdb['fields']
+        assert len(blastdb) == 2
+
+        runner.invoke(biomaj2galaxy, ['add', '--dbkey', new_dbkey, '--dbkey-display-name', new_dbkey_name, '--no-file-check', 'bowtie2:/some/other_path/foo/bar'], catch_exceptions=False)
+
+        bowtie2 = self.gi.tool_data.show_data_table('bowtie2_indexes')
+        bowtie2 = bowtie2['fields']
+        assert bowtie2 == [[new_dbkey, new_dbkey, new_dbkey_name, '/some/other_path/foo/bar']]
+
+    def test_add_manifest(self):
+
+        manifest = tempfile.NamedTemporaryFile(mode='w', suffix='.yml', delete=False)
+        manifest.write("""
+- dbkey: test_dbkey
+  name: My cool dbkey
+  files:
+    - bowtie2:/some/path/foo/bar
+- dbkey: test_dbkey_2
+  name: My other dbkey
+  files:
+    - bowtie2:/some/other_path/foo/bar
+    - twobit:/foo/really/foo/bar
+""")
+        manifest.close()
+
+        runner = CliRunner()
+        runner.invoke(biomaj2galaxy, ['add', '--no-file-check', '--manifest', manifest.name], catch_exceptions=False)
+        os.remove(manifest.name)
+
+        dbkeys = self.gi.tool_data.show_data_table('__dbkeys__')
+        dbkeys = dbkeys['fields']
+        assert ['test_dbkey', 'My cool dbkey', ''] in dbkeys
+        assert ['test_dbkey_2', 'My other dbkey', ''] in dbkeys
+
+        bowtie2 = self.gi.tool_data.show_data_table('bowtie2_indexes')
+        bowtie2 = bowtie2['fields']
+        assert ['test_dbkey', 'test_dbkey', 'My cool dbkey', '/some/path/foo/bar'] in bowtie2
+        assert ['test_dbkey_2', 'test_dbkey_2', 'My other dbkey', '/some/other_path/foo/bar'] in bowtie2
+
+        twobit = self.gi.tool_data.show_data_table('twobit')
+        twobit = twobit['fields']
+        assert ['test_dbkey_2', '/foo/really/foo/bar'] in twobit
+
     def test_rm_bowtie2(self):
 
         new_dbkey = 'test_dbkey'
@@ -0,0 +1,289 @@
+"""
+A fake Galaxy instance keeping its data tables, jobs and data libraries in memory, used by the unit tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from bioblend import ConnectionError
+
+from biomaj2galaxy import Context
+from biomaj2galaxy.cli import biomaj2galaxy
+from biomaj2galaxy.config import global_config_path, set_global_config_path
+
+from click.testing import CliRunner
+
+# Check the jobs without waiting
+POLL_POLICY = {'min_interval': 0, 'max_interval': 0, 'factor': 1, 'jitter': 0}
+
+
+def next_value(values):
+    """
+    Get the next value of a list of successive values (the last one being repeated), or the value itself
+    """
+    if not isinstance(values, list):
+        return values
+    return values.pop(0) if len(values) > 1 else values[0]
+
+
+def short_tool_id(tool_id):
+    """
+    'toolshed.g2.bx.psu.edu/repos/iuc/data_manager_manual/data_manager_manual/0.0.2' -> 'data_manager_manual'
+    """
+    return tool_id.split('/')[-2] if '/' in tool_id else tool_id
+
+
+class Client(object):
+
+    def __init__(self, gi):
+        self.gi = gi
+
+
+class ToolData(Client):
+
+    def get_data_tables(self):
+        self.gi.call('get_data_tables')
+        return [{'name': name, 'model_class': 'TabularToolDataTable'} for name in self.gi.tables]
+
+    def show_data_table(self, table):
+        self.gi.call('show_data_table', table)
+        return self.gi.table_content(table)
+
+    def reload_data_table(self, table):
+        self.gi.call('reload_data_table', table)
+        if table in self.gi.reloads:
+            result = next_value(self.gi.reloads[table])
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return self.gi.table_content(table)
+
+    def delete_data_table(self, table, values):
+        self.gi.call('delete_data_table', table, values)
+        row = values.split('\t')
+        if table in self.gi.tables:
+            self.gi.tables[table]['fields'] = [f for f in self.gi.tables[table]['fields'] if f != row]
+
+
+class Tools(Client):
+
+    def run_tool(self, history_id, tool_id, params):
+        tool_id = short_tool_id(tool_id)
+        self.gi.call('run_tool', tool_id)
+        states = list(self.gi.tool_states.get(tool_id, ['running', 'ok']))
+
+        if tool_id == 'data_manager_manual' and states[-1] == 'ok':
+            self.gi.add_manual_rows(params)
+
+        dataset_id = self.gi.new_id('d')
+        job_id = self.gi.new_id('j')
+        self.gi.states[dataset_id] = list(states)
+        self.gi.states[job_id] = list(states)
+        self.gi.histories_contents.setdefault('h1', []).append(dataset_id)
+        self.gi.runs.append({'tool_id': tool_id, 'params': params, 'dataset_id': dataset_id, 'job_id': job_id})
+        return {'outputs': [{'id': dataset_id, 'history_id': 'h1'}], 'jobs': [{'id': job_id}]}
+
+
+class Jobs(Client):
+
+    def get_state(self, job_id):
+        self.gi.call('get_state', job_id)
+        return next_value(self.gi.states[job_id])
+
+    def show_job(self, job_id, full_details=False):
+        self.gi.call('show_job', job_id)
+        return {'id': job_id, 'stdout': '', 'stderr': 'Job %s failed' % job_id}
+
+
+class Datasets(Client):
+
+    def show_dataset(self, dataset_id):
+        self.gi.call('show_dataset', dataset_id)
+        return {'id': dataset_id, 'state': next_value(self.gi.states[dataset_id])}
+
+
+class Histories(Client):
+
+    def show_history(self, history_id, contents=False):
+        self.gi.call('show_history', history_id)
+        return [{'id': d, 'state': next_value(self.gi.states[d])} for d in self.gi.histories_contents.get(history_id, [])]
+
+
+class Roles(Client):
+
+    def get_roles(self):
+        self.gi.call('get_roles')
+        return [{'id': role_id, 'name': name} for name, role_id in sorted(self.gi.roles_ids.items())]
+
+
+class Libraries(Client):
+
+    def get_libraries(self, library_id=None, name=None, deleted=False):
+        self.gi.call('get_libraries')
+        return [dict(lib) for lib in self.gi.libraries_list]
+
+    def create_library(self, name, description=None, synopsis=None):
+        self.gi.call('create_library', name)
+        return self.gi.add_library(name)
+
+    def get_folders(self, library_id, folder_id=None, name=None):
+        self.gi.call('get_folders', library_id)
+        return [{'id': f['id'], 'name': f['name']} for f in self.gi.folders_list if f['library_id'] == library_id]
+
+    def create_folder(self, library_id, folder_name, description=None, base_folder_id=None):
+        self.gi.call('create_folder', library_id, folder_name)
+        if base_folder_id is None:
+            base_folder_id = self.gi.root_folder(library_id)
+        return [self.gi.add_folder(library_id, folder_name, base_folder_id)]
+
+    def upload_from_galaxy_filesystem(self, library_id, filesystem_paths, folder_id=None, file_type='auto', dbkey='?', link_data_only=None, roles=''):
+        self.gi.call('upload_from_galaxy_filesystem', library_id)
+        if folder_id is None:
+            folder_id = self.gi.root_folder(library_id)
+        return [self.gi.add_library_dataset(library_id, folder_id, path) for path in filesystem_paths.split('\n')]
+
+    def set_library_permissions(self, library_id, access_in=None, modify_in=None, add_in=None, manage_in=None):
+        self.gi.call('set_library_permissions', library_id)
+
+    def show_dataset(self, library_id, dataset_id):
+        self.gi.call('show_library_dataset', dataset_id)
+        dataset = self.gi.library_datasets[dataset_id]
+        return dict(dataset, state=next_value(self.gi.states[dataset_id]))
+
+    def delete_library_dataset(self, library_id, dataset_id, purged=False):
+        self.gi.call('delete_library_dataset', dataset_id)
+        self.gi.library_datasets.pop(dataset_id)
+        return {'id': dataset_id, 'deleted': True}
+
+
+class Folders(Client):
+
+    def show_folder(self, folder_id, contents=False, limit=None, offset=0):
+        self.gi.call('show_folder', folder_id)
+        items = [{'type': 'folder', 'id': f['id'], 'name': f['name'].split('/')[-1]} for f in self.gi.folders_list if f.get('parent_id') == folder_id]
+        for dataset in self.gi.library_datasets.values():
+            if dataset['folder_id'] == folder_id:
+                item = {'type': 'file', 'id': dataset['id'], 'name': dataset['name']}
+                if self.gi.folder_states:
+                    item['state'] = next_value(self.gi.states[dataset['id']])
+                items.append(item)
+
+        total = len(items)
+        if limit is not None:
+            items = items[offset:offset + limit]
+        return {'folder_contents': items, 'metadata': {'total_rows': total}}
+
+    def delete_folder(self, folder_id, undelete=False):
+        self.gi.call('delete_folder', folder_id)
+        self.gi.folders_list = [f for f in self.gi.folders_list if f['id'] != folder_id]
+
+
+class FakeGalaxy(object):
+    """
+    tables maps data table names to their 'columns' and 'fields'.
+    states maps dataset and job ids to their state, or to the list of their successive states (the last one being repeated).
+    errors maps call names ('reload_data_table', or 'reload_data_table:all_fasta' for a single table) to the list of
+    exceptions raised by the next calls.
+    Each call is recorded in calls, as 'name:arg1:arg2'.
+    """
+
+    def __init__(self, tables=None, states=None, errors=None, base_url='http://localhost'):
+        self.base_url = base_url
+        self.calls = []
+        self.errors = errors or {}
+        self.tables = tables or {}
+        self.reloads = {}  # Successive results of reload_data_table() for some tables, instead of their content
+        self.states = states or {}
+        self.tool_states = {}  # Successive states of the jobs launched by each tool (short id), ['running', 'ok'] by default
+        self.runs = []
+        self.histories_contents = {}
+        self.roles_ids = {}
+        self.libraries_list = []
+        self.folders_list = []
+        self.library_datasets = {}
+        self.folder_states = True  # Some Galaxy versions don't give the state of the datasets in folder contents
+        self._ids = {}
+
+        self.tool_data = ToolData(self)
+        self.tools = Tools(self)
+        self.jobs = Jobs(self)
+        self.datasets = Datasets(self)
+        self.histories = Histories(self)
+        self.roles = Roles(self)
+        self.libraries = Libraries(self)
+        self.folders = Folders(self)
+
+    def call(self, name, *args):
+        key = ':'.join((name,) + args)
+        self.calls.append(key)
+        for k in (key, name):
+            if self.errors.get(k):
+                raise self.errors[k].pop(0)
+
+    def new_id(self, prefix):
+        self._ids[prefix] = self._ids.get(prefix, 0) + 1
+        return '%s%s' % (prefix, self._ids[prefix])
+
+    def table_content(self, table):
+        if table not in self.tables:
+            raise ConnectionError("Unexpected HTTP status code: 400", status_code=400)
+        return {'name': table, 'columns': list(self.tables[table]['columns']), 'fields': [list(f) for f in self.tables[table]['fields']]}
+
+    def add_manual_rows(self, params):
+        """
+        Add the rows of a data_manager_manual job to the tables
+        """
+        n = 0
+        while 'data_tables_%s|data_table_name' % n in params:
+            row = []
+            while 'data_tables_%s|columns_%s|data_table_column_value' % (n, len(row)) in params:
+                row.append(params['data_tables_%s|columns_%s|data_table_column_value' % (n, len(row))])
+            self.tables[params['data_tables_%s|data_table_name' % n]]['fields'].append(row)
+            n += 1
+
+    def add_library(self, name):
+        library = {'id': self.new_id('l'), 'name': name, 'deleted': False}
+        self.libraries_list.append(library)
+        self.folders_list.append({'id': self.new_id('f'), 'name': '/', 'library_id': library['id']})
+        return dict(library)
+
+    def root_folder(self, library_id):
+        return [f['id'] for f in self.folders_list if f['library_id'] == library_id and f['name'] == '/'][0]
+
+    def add_folder(self, library_id, name, parent_id):
+        parent = [f for f in self.folders_list if f['id'] == parent_id][0]
+        folder = {'id': self.new_id('f'), 'name': parent['name'].rstrip('/') + '/' + name, 'library_id': library_id, 'parent_id': parent_id}
+        self.folders_list.append(folder)
+        return {'id': folder['id'], 'name': folder['name']}
+
+    def add_library_dataset(self, library_id, folder_id, path, state='ok'):
+        dataset = {'id': self.new_id('ld'), 'name': os.path.basename(path), 'file_name': path, 'folder_id': folder_id, 'library_id': library_id}
+        self.library_datasets[dataset['id']] = dataset
+        self.states[dataset['id']] = state
+        return {'id': dataset['id'], 'name': dataset['name']}
+
+
+def run_command(gi, args):
+    """
+    Run biomaj2galaxy with the given arguments on a fake Galaxy instance, checking the jobs without waiting
+    """
+    context = Context()
+    context.gi = gi
+    return CliRunner().invoke(biomaj2galaxy, ['--poll-min-interval', '0', '--poll-max-interval', '0'] + args, obj=context)
+
+
+class ConfigDirTestCase(unittest.TestCase):
+    """
+    Use a copy of the config file in a temporary directory, where the caches and the journal are written
+    """
+
+    def setUp(self):
+        self.config_path = global_config_path()
+        self.tmp_dir = tempfile.mkdtemp()
+        shutil.copy(self.config_path, self.tmp_dir)
+        set_global_config_path(os.path.join(self.tmp_dir, os.path.basename(self.config_path)))
+
+    def tearDown(self):
+        set_global_config_path(self.config_path)
+        shutil.rmtree(self.tmp_dir)
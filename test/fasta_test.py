@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from biomaj2galaxy import fasta
+
+
+class FastaTest(unittest.TestCase):
+
+    def test_index_fasta(self):
+
+        records = fasta.index_fasta(self.fasta_path)
+
+        assert [(r[0], r[1]) for r in records] == [('chr2', 6), ('chr1', 6), ('empty', 0), ('chr10', 3)]
+        assert records[0][2] == 0
+        assert records[-1][3] == os.path.getsize(self.fasta_path)
+
+    def test_index_fasta_small_chunks(self):
+
+        chunk_size = fasta.CHUNK_SIZE
+        fasta.CHUNK_SIZE = 3
+        try:
+            records = fasta.index_fasta(self.fasta_path)
+        finally:
+            fasta.CHUNK_SIZE = chunk_size
+
+        assert [(r[0], r[1]) for r in records] == [('chr2', 6), ('chr1', 6), ('empty', 0), ('chr10', 3)]
+
+    def test_prepare_genome_as_is(self):
+
+        fasta_path, len_path = fasta.prepare_genome(self.fasta_path, 'as_is')
+
+        assert fasta_path == self.fasta_path
+        assert len_path == os.path.splitext(self.fasta_path)[0] + '.len'
+        with open(len_path) as f:
+            assert f.read() == "chr2\t6\nchr1\t6\nempty\t0\nchr10\t3\n"
+
+    def test_prepare_genome_gatk(self):
+
+        fasta_path, len_path = fasta.prepare_genome(self.fasta_path, 'gatk')
+
+        assert fasta_path == os.path.join(self.tmp_dir, 'genome.sorted.fa')
+        with open(len_path) as f:
+            assert f.read() == "chr1\t6\nchr2\t6\nchr10\t3\nempty\t0\n"
+        assert [r[0] for r in fasta.index_fasta(fasta_path)] == ['chr1', 'chr2', 'chr10', 'empty']
+
+    def test_prepare_genome_custom(self):
+
+        fasta_path, len_path = fasta.prepare_genome(self.fasta_path, 'custom', ['chr10', 'chr1'], 'discard')
+        with open(fasta_path) as f:
+            assert f.read() == ">chr10\nA C G\n>chr1\nAAAA\nCC\n"
+
+        fasta_path, len_path = fasta.prepare_genome(self.fasta_path, 'custom', ['chr10'], 'keep_append')
+        assert [r[0] for r in fasta.index_fasta(fasta_path)] == ['chr10', 'chr2', 'chr1', 'empty']
+
+        fasta_path, len_path = fasta.prepare_genome(self.fasta_path, 'custom', ['chr10'], 'keep_prepend')
+        assert [r[0] for r in fasta.index_fasta(fasta_path)] == ['chr2', 'chr1', 'empty', 'chr10']
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fasta_path = os.path.join(self.tmp_dir, 'genome.fa')
+        with open(self.fasta_path, 'w') as f:
+            f.write(">chr2 some description\nACGT\nAC\n>chr1\nAAAA\nCC\n>empty\n>chr10\nA C G\n")
+
+    def tearDown(self):
+        for fn in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, fn))
+        os.rmdir(self.tmp_dir)
@@ -0,0 +1,115 @@
+from biomaj2galaxy.journal import add_journal_entry, read_journal, remove_journal_entry
+
+from .fake_galaxy import ConfigDirTestCase, FakeGalaxy, run_command
+
+
+def table(*fields):
+    return {'columns': ['value', 'path'], 'fields': [list(f) for f in fields]}
+
+
+def actions(gi):
+    """The jobs launched and the tables reloaded"""
+    return [c for c in gi.calls if c.startswith(('run_tool', 'reload_data_table'))]
+
+
+def item(dataset_id, name=None):
+    return {'dataset_id': dataset_id, 'history_id': 'h1', 'job_id': None, 'name': name}
+
+
+class JournalTest(ConfigDirTestCase):
+
+    def test_journal(self):
+
+        gi = FakeGalaxy()
+        first = add_journal_entry(gi, 'add', 'first', [item('ds1')], reload_tables=['all_fasta'])
+        second = add_journal_entry(gi, 'add', 'second', [item('ds2')])
+        add_journal_entry(FakeGalaxy(base_url='http://other'), 'add', 'other', [item('ds3')])
+
+        # Only the entries of the instance, oldest first
+        entries = read_journal(gi)
+        assert [e['description'] for e in entries] == ['first', 'second']
+        assert entries[0]['reload_tables'] == ['all_fasta']
+        assert entries[1]['reload_tables'] == []
+
+        remove_journal_entry(first)
+        assert [e['id'] for e in read_journal(gi)] == [second['id']]
+
+    def test_status(self):
+
+        gi = FakeGalaxy(states={'ds1': 'ok', 'ds2': 'error', 'ds3': 'running'})
+        add_journal_entry(gi, 'add', 'hg19', [item('ds1'), item('ds2', 'Bowtie2'), item('ds3')], steps=[
+            {'name': 'manual', 'job': {'tool_id': 'manual_dm', 'params': {}, 'name': 'Manual'}, 'depends': ['fasta']},
+        ])
+
+        result = run_command(gi, ['status'])
+        assert result.exit_code == 0
+        assert "'hg19': 1 ok, 1 running, 1 failed" in result.output
+        assert "'Bowtie2' finished in 'error' state" in result.output
+        assert "'Manual' will be submitted" in result.output
+
+        # Nothing changed
+        assert len(read_journal(gi)) == 1
+        assert actions(gi) == []
+
+    def test_finalize_reload(self):
+
+        gi = FakeGalaxy(states={'ds1': 'ok', 'ds2': 'ok', 'ds3': 'running'}, tables={'all_fasta': table(['hg19', 'new'], ['mm10', 'new']), '__dbkeys__': table()})
+        add_journal_entry(gi, 'add', 'hg19', [item('ds1')], reload_tables={'all_fasta': {'present': [['hg19', 'new']], 'absent': [['hg19', 'old']]}})
+        add_journal_entry(gi, 'add', 'mm10', [item('ds2')], reload_tables={'all_fasta': {'present': [['mm10', 'new']]}, '__dbkeys__': {}})
+        running = add_journal_entry(gi, 'add', 'dm6', [item('ds3')], reload_tables={'all_fasta': {'present': [['dm6', 'new']]}})
+
+        result = run_command(gi, ['finalize'])
+        assert result.exit_code == 0
+
+        # The finished entries are finalized together, each table being reloaded once
+        assert sorted(actions(gi)) == ['reload_data_table:__dbkeys__', 'reload_data_table:all_fasta']
+        assert "Finalized add 'hg19'" in result.output
+        assert "Finalized add 'mm10'" in result.output
+        assert "Jobs of add 'dm6' (%s) are still running" % running['id'] in result.output
+        assert [e['id'] for e in read_journal(gi)] == [running['id']]
+
+    def test_finalize_failed(self):
+
+        gi = FakeGalaxy(states={'ds1': 'error', 'ds2': 'ok'})
+        failed = add_journal_entry(gi, 'add', 'hg19', [item('ds1'), item('ds2')], reload_tables=['all_fasta'])
+
+        # Failed entries are kept by default
+        result = run_command(gi, ['finalize'])
+        assert result.exit_code != 0
+        assert "1 recorded run(s) had failed jobs" in str(result.exception)
+        assert [e['id'] for e in read_journal(gi)] == [failed['id']]
+        assert actions(gi) == []
+
+        result = run_command(gi, ['finalize', '--discard-failed'])
+        assert result.exit_code != 0
+        assert read_journal(gi) == []
+        assert actions(gi) == []
+
+    def test_finalize_steps(self):
+
+        gi = FakeGalaxy(states={'ds1': 'ok'}, tables={'all_fasta': table(['hg19', '/path'])})
+        steps = [{'name': 'manual', 'job': {'tool_id': 'manual_dm', 'params': {}, 'name': 'Manual'}, 'depends': ['fasta']}]
+        entry = add_journal_entry(gi, 'add', 'hg19', [dict(item('ds1'), step='fasta')], reload_tables=['all_fasta'], steps=steps)
+
+        # The waiting jobs are launched, the tables are reloaded at the next run
+        result = run_command(gi, ['finalize'])
+        assert result.exit_code == 0
+        assert actions(gi) == ['run_tool:manual_dm']
+        entries = read_journal(gi)
+        assert [e['id'] for e in entries] == [entry['id']]
+        assert entries[0]['steps'] == []
+        assert [i['dataset_id'] for i in entries[0]['items']] == ['ds1', 'd1']
+
+        result = run_command(gi, ['finalize'])
+        assert "Jobs of add 'hg19' (%s) are still running" % entry['id'] in result.output
+        result = run_command(gi, ['finalize'])
+        assert actions(gi) == ['run_tool:manual_dm', 'reload_data_table:all_fasta']
+        assert read_journal(gi) == []
+
+        # All at once with --wait
+        gi = FakeGalaxy(states={'ds1': 'ok'}, tables={'all_fasta': table(['hg19', '/path'])})
+        add_journal_entry(gi, 'add', 'hg19', [dict(item('ds1'), step='fasta')], reload_tables=['all_fasta'], steps=steps)
+        result = run_command(gi, ['finalize', '--wait'])
+        assert result.exit_code == 0
+        assert actions(gi) == ['run_tool:manual_dm', 'reload_data_table:all_fasta']
+        assert read_journal(gi) == []
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from biomaj2galaxy.utils import add_files, check_existing, get_folder_contents
+
+from .fake_galaxy import FakeGalaxy, run_command
+
+
+class LibraryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_add_files(self):
+
+        gi = FakeGalaxy()
+        library_id = gi.add_library('lib')['id']
+        files = ['/data/file%s' % i for i in range(5)]
+
+        # One request per batch, the permissions are set once
+        uploaded = add_files(gi, library_id, 'f1', files, ['r1'], 'auto', batch_size=2)
+        assert [u['name'] for u in uploaded] == ['file%s' % i for i in range(5)]
+        assert gi.calls == ['upload_from_galaxy_filesystem:l1'] * 3 + ['set_library_permissions:l1']
+        assert [d['file_name'] for d in gi.library_datasets.values()] == files
+
+        del gi.calls[:]
+        assert add_files(gi, library_id, 'f1', [], ['r1'], 'auto') == []
+        assert gi.calls == []
+
+    def test_add_lib_batches(self):
+
+        for name in ['a.fa', 'b.fa', 'c.fa']:
+            open(os.path.join(self.tmp_dir, name), 'w').close()
+
+        gi = FakeGalaxy()
+        result = run_command(gi, ['add-lib', '-l', 'lib', '-f', '/genome', '--batch-size', '2'] + [os.path.join(self.tmp_dir, name) for name in ['a.fa', 'b.fa', 'c.fa']])
+        assert result.exit_code == 0
+
+        assert gi.calls.count('upload_from_galaxy_filesystem:l1') == 2
+        assert sorted(d['name'] for d in gi.library_datasets.values()) == ['a.fa', 'b.fa', 'c.fa']
+        assert set(d['folder_id'] for d in gi.library_datasets.values()) == set(['f2'])
+
+    def fake_library(self):
+        """A library with the same file in two folders"""
+        gi = FakeGalaxy()
+        library_id = gi.add_library('lib')['id']
+        genome = gi.add_folder(library_id, 'genome', 'f1')['id']
+        other = gi.add_folder(library_id, 'other', 'f1')['id']
+        gi.add_library_dataset(library_id, genome, '/v1/genome.fa')
+        gi.add_library_dataset(library_id, genome, '/v1/genes.gtf')
+        gi.add_library_dataset(library_id, other, '/v1/genome.fa')
+        return gi, library_id, genome
+
+    def test_check_existing(self):
+
+        gi, library_id, genome = self.fake_library()
+
+        # Only the destination folder is listed
+        check_existing(gi, library_id, ['genome'], ['/v2/genome.fa', '/v2/new.fa'], False, folder_id=genome)
+        assert gi.calls == ['show_folder:%s' % genome]
+
+        del gi.calls[:]
+        check_existing(gi, library_id, ['genome'], ['/v2/genome.fa', '/v2/new.fa'], True)
+        assert gi.calls == ['get_folders:l1', 'show_folder:%s' % genome, 'delete_library_dataset:ld1']
+        assert sorted(d['file_name'] for d in gi.library_datasets.values()) == ['/v1/genes.gtf', '/v1/genome.fa']
+
+        # Missing folder
+        del gi.calls[:]
+        check_existing(gi, library_id, ['missing'], ['/v2/genome.fa'], True)
+        assert gi.calls == ['get_folders:l1']
+
+    def test_get_folder_contents(self):
+
+        gi, library_id, genome = self.fake_library()
+        gi.add_folder(library_id, 'sub', genome)
+
+        contents = get_folder_contents(gi, genome, page_size=2)
+        assert sorted(c['name'] for c in contents) == ['genes.gtf', 'genome.fa', 'sub']
+        assert gi.calls == ['show_folder:%s' % genome] * 2
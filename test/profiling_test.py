@@ -0,0 +1,39 @@
+import unittest
+
+from biomaj2galaxy.profiling import Profiler, endpoint_name, percentile
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def test_endpoint_name(self):
+
+        assert endpoint_name('GET', 'http://localhost/galaxy/api/jobs/0123456789abcdef') == 'GET /api/jobs/{id}'
+        assert endpoint_name('GET', 'http://localhost/api/tool_data/all_fasta/reload') == 'GET /api/tool_data/all_fasta/reload'
+        assert endpoint_name('POST', 'http://localhost/api/folders/0123456789abcdef/contents?limit=10') == 'POST /api/folders/{id}/contents'
+
+    def test_percentile(self):
+
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 90) == 90
+        assert percentile(values, 99) == 99
+        assert percentile([3], 99) == 3
+        assert percentile([], 50) == 0
+
+    def test_summary(self):
+
+        profiler = Profiler()
+        profiler.record_request('GET', 'http://localhost/api/jobs/0123456789abcdef', 0.2, received=100, status_code=200)
+        profiler.record_request('GET', 'http://localhost/api/jobs/fedcba9876543210', 0.4, received=100, status_code=503)
+        profiler.record_request('GET', 'http://localhost/api/tool_data', 0.1, status_code=200)
+        profiler.record_wait('wait_completion', 5)
+
+        assert len(profiler.requests['GET /api/jobs/{id}']['durations']) == 2
+        assert profiler.requests['GET /api/jobs/{id}']['errors'] == 1
+        assert profiler.requests['GET /api/jobs/{id}']['received'] == 200
+
+        lines = profiler.summary()
+        assert lines[1].startswith('GET /api/jobs/{id}')
+        assert lines[2].startswith('GET /api/tool_data')
+        assert any(line.startswith('wait_completion') for line in lines)
+        assert lines[-1].startswith('Requests: 3 (0.70 s), waiting: 5.00 s')
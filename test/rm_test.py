@@ -0,0 +1,80 @@
+from biomaj2galaxy.utils import write_tables_cache
+
+from .fake_galaxy import ConfigDirTestCase, FakeGalaxy, run_command
+
+
+def fake_galaxy():
+    return FakeGalaxy(tables={
+        '__dbkeys__': {'columns': ['value', 'name', 'len_path'], 'fields': [['hg19', 'Human', '/hg19.len'], ['mm10', 'Mouse', '/mm10.len']]},
+        'all_fasta': {'columns': ['value', 'dbkey', 'name', 'path'], 'fields': [['hg19', 'hg19', 'Human', '/hg19.fa'], ['mm10', 'mm10', 'Mouse', '/mm10.fa']]},
+        'blastdb': {'columns': ['value', 'name', 'path'], 'fields': [['hg19_genome', 'Human', '/blast/hg19'], ['mm10', 'Mouse', '/blast/mm10']]},
+    })
+
+
+def shown(gi):
+    """The downloaded tables"""
+    return sorted(c.split(':')[1] for c in gi.calls if c.startswith('show_data_table'))
+
+
+class RmTest(ConfigDirTestCase):
+
+    def test_rm(self):
+
+        gi = fake_galaxy()
+        result = run_command(gi, ['rm', 'hg19'])
+        assert result.exit_code == 0
+
+        assert gi.tables['__dbkeys__']['fields'] == [['mm10', 'Mouse', '/mm10.len']]
+        assert gi.tables['all_fasta']['fields'] == [['mm10', 'mm10', 'Mouse', '/mm10.fa']]
+        assert gi.tables['blastdb']['fields'] == [['mm10', 'Mouse', '/blast/mm10']]
+
+        # Without cache, the tables downloaded to get their format are not downloaded again
+        assert shown(gi) == ['__dbkeys__', 'all_fasta', 'blastdb']
+        assert sorted(c for c in gi.calls if c.startswith('reload_data_table')) == ['reload_data_table:__dbkeys__', 'reload_data_table:all_fasta', 'reload_data_table:blastdb']
+
+    def test_rm_cached(self):
+
+        gi = fake_galaxy()
+        write_tables_cache(gi, {name: table['columns'] for name, table in gi.tables.items()})
+
+        # Only the relevant tables are downloaded
+        result = run_command(gi, ['rm', '--exact', 'hg19', 'fasta'])
+        assert result.exit_code == 0
+        assert shown(gi) == ['__dbkeys__', 'all_fasta']
+        assert gi.tables['all_fasta']['fields'] == [['mm10', 'mm10', 'Mouse', '/mm10.fa']]
+        assert gi.tables['blastdb']['fields'] == [['hg19_genome', 'Human', '/blast/hg19'], ['mm10', 'Mouse', '/blast/mm10']]
+
+    def test_rm_outdated_cache(self):
+
+        gi = fake_galaxy()
+        write_tables_cache(gi, {name: table['columns'] for name, table in gi.tables.items()})
+
+        # A table removed from Galaxy since the cache was written
+        del gi.tables['blastdb']
+        result = run_command(gi, ['rm', 'hg19'])
+        assert result.exit_code == 0
+        assert shown(gi) == ['__dbkeys__', 'all_fasta']
+
+        # A new table
+        gi.tables['bowtie2_indexes'] = {'columns': ['value', 'dbkey', 'name', 'path'], 'fields': [['mm10', 'mm10', 'Mouse', '/bowtie2/mm10']]}
+        del gi.calls[:]
+        result = run_command(gi, ['rm', 'mm10'])
+        assert result.exit_code == 0
+        assert shown(gi) == ['__dbkeys__', 'all_fasta', 'bowtie2_indexes']
+        assert gi.tables['bowtie2_indexes']['fields'] == []
+
+    def test_rm_patterns(self):
+
+        gi = fake_galaxy()
+
+        # Regular expressions are not split on commas
+        result = run_command(gi, ['rm', '--regex', '--exact', '[a-z]{2}[0-9]{1,2}', 'blastdb'])
+        assert result.exit_code == 0
+        assert gi.tables['blastdb']['fields'] == [['hg19_genome', 'Human', '/blast/hg19']]
+        assert gi.tables['__dbkeys__']['fields'] == []
+        assert len(gi.tables['all_fasta']['fields']) == 2
+
+        result = run_command(gi, ['rm', 'unknown', '-p', 'hg19*'])
+        assert result.exit_code == 0
+        assert gi.tables['blastdb']['fields'] == []
+        assert gi.tables['all_fasta']['fields'] == [['mm10', 'mm10', 'Mouse', '/mm10.fa']]
@@ -0,0 +1,94 @@
+import socket
+import threading
+import time
+import unittest
+
+from bioblend import ConnectionError
+
+from biomaj2galaxy.session import AdaptiveLimiter, PooledGalaxyInstance, parse_retry_after
+
+
+class SessionTest(unittest.TestCase):
+
+    def test_parse_retry_after(self):
+
+        assert parse_retry_after('3') == 3
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+        assert parse_retry_after('soon') is None
+        assert parse_retry_after(None) is None
+
+    def test_limiter_aimd(self):
+
+        limiter = AdaptiveLimiter(4, slow_request=10)
+
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True)
+        assert limiter.limit == 2
+
+        limiter.acquire()
+        limiter.release(11)
+        assert limiter.limit == 1
+
+        for i in range(10):
+            limiter.acquire()
+            limiter.release(0.1)
+        assert 1 < limiter.limit <= 4
+
+        for i in range(100):
+            limiter.acquire()
+            limiter.release(0.1)
+        assert limiter.limit == 4
+
+    def test_limiter_in_flight(self):
+
+        limiter = AdaptiveLimiter(2)
+        limiter.acquire()
+        limiter.acquire()
+
+        acquired = threading.Event()
+
+        def third():
+            limiter.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=third)
+        thread.start()
+        assert not acquired.wait(0.2)
+
+        limiter.release(0.1)
+        assert acquired.wait(2)
+        thread.join()
+        assert limiter.in_flight == 2
+
+    def test_limiter_retry_after(self):
+
+        limiter = AdaptiveLimiter(2)
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True, retry_after=0.3)
+
+        start = time.time()
+        limiter.acquire()
+        assert time.time() - start >= 0.25
+
+    def test_network_errors(self):
+
+        # Accepts connections, but never responds
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(5)
+        port = server.getsockname()[1]
+
+        try:
+            gi = PooledGalaxyInstance('http://127.0.0.1:%s' % port, 'key', http={'read_timeout': 0.2, 'retries': 0})
+            with self.assertRaises(ConnectionError) as raised:
+                gi.make_delete_request(gi.url + '/tool_data/all_fasta', payload={'values': 'hg19'})
+            assert raised.exception.status_code is None
+            assert gi.limiter.in_flight == 0
+            assert gi.limiter.limit == gi.limiter.max_limit / 2
+        finally:
+            server.close()
+
+        # Closed port
+        gi = PooledGalaxyInstance('http://127.0.0.1:%s' % port, 'key', http={'retries': 0})
+        with self.assertRaises(ConnectionError):
+            gi.make_delete_request(gi.url + '/tool_data/all_fasta', payload={'values': 'hg19'})
@@ -0,0 +1,99 @@
+import unittest
+
+from bioblend import ConnectionError
+
+from biomaj2galaxy.utils import FEW_DATASETS, get_states, wait_all
+
+from .fake_galaxy import FakeGalaxy, POLL_POLICY
+
+
+def history_items(gi, number, state='ok'):
+    """Add datasets to the history h1"""
+    items = []
+    for i in range(number):
+        dataset_id = gi.new_id('d')
+        gi.states[dataset_id] = list(state) if isinstance(state, list) else state
+        gi.histories_contents.setdefault('h1', []).append(dataset_id)
+        items.append({'dataset_id': dataset_id, 'history_id': 'h1', 'name': 'Dataset %s' % dataset_id})
+    return items
+
+
+def library_items(gi, number, state='ok'):
+    """Add datasets to the root folder of a new library"""
+    library = gi.add_library('lib')
+    folder_id = gi.root_folder(library['id'])
+    items = []
+    for i in range(number):
+        dataset = gi.add_library_dataset(library['id'], folder_id, '/data/file%s' % i, list(state) if isinstance(state, list) else state)
+        items.append({'dataset_id': dataset['id'], 'library_id': library['id'], 'folder_id': folder_id})
+    return items
+
+
+class StatesTest(unittest.TestCase):
+
+    def test_get_states_history(self):
+
+        # A few datasets are checked one by one
+        gi = FakeGalaxy()
+        items = history_items(gi, FEW_DATASETS)
+        assert get_states(gi, items) == {item['dataset_id']: 'ok' for item in items}
+        assert gi.calls == ['show_dataset:%s' % item['dataset_id'] for item in items]
+
+        # Otherwise the history is listed once
+        gi = FakeGalaxy()
+        items = history_items(gi, FEW_DATASETS + 1, state='running')
+        assert get_states(gi, items) == {item['dataset_id']: 'running' for item in items}
+        assert gi.calls == ['show_history:h1']
+
+        # Datasets without history
+        gi = FakeGalaxy(states={'d1': 'queued'})
+        assert get_states(gi, [{'dataset_id': 'd1'}]) == {'d1': 'queued'}
+        assert gi.calls == ['show_dataset:d1']
+
+    def test_get_states_library(self):
+
+        gi = FakeGalaxy()
+        items = library_items(gi, 5)
+        assert get_states(gi, items) == {item['dataset_id']: 'ok' for item in items}
+        assert gi.calls == ['show_folder:f1']
+
+        # Some Galaxy versions don't give the state in folder contents
+        gi.folder_states = False
+        del gi.calls[:]
+        assert get_states(gi, items[:2]) == {item['dataset_id']: 'ok' for item in items[:2]}
+        assert gi.calls == ['show_folder:f1', 'show_library_dataset:ld1', 'show_library_dataset:ld2']
+
+    def test_wait_all(self):
+
+        gi = FakeGalaxy()
+        items = history_items(gi, 5, state=['queued', 'running', 'ok']) + library_items(gi, 2, state=['running', 'ok'])
+        gi.errors = {'show_history': [ConnectionError("Bad gateway", status_code=502)]}
+
+        states = wait_all(gi, items, poll_policy=POLL_POLICY)
+        assert states == {item['dataset_id']: 'ok' for item in items}
+
+        # Only the pending datasets are checked again: the history is listed once more, for the transient error
+        assert gi.calls.count('show_folder:f1') == 2
+        assert gi.calls.count('show_history:h1') == 4
+
+        gi = FakeGalaxy(errors={'show_dataset': [ConnectionError("Not found", status_code=404)]})
+        with self.assertRaises(ConnectionError):
+            wait_all(gi, history_items(gi, 1), poll_policy=POLL_POLICY)
+
+    def test_wait_all_errors(self):
+
+        gi = FakeGalaxy()
+        items = history_items(gi, 2) + history_items(gi, 1, state=['running', 'error'])
+        items[2]['job_id'] = 'j1'
+
+        # The failed datasets are reported with the details of the first failed job
+        with self.assertRaises(Exception) as raised:
+            wait_all(gi, items, poll_policy=POLL_POLICY)
+        assert "1 job(s) finished in error state" in str(raised.exception)
+        assert 'show_job:j1' in gi.calls
+
+        # Or returned
+        gi = FakeGalaxy()
+        items = history_items(gi, 1) + history_items(gi, 1, state='failed_metadata')
+        assert wait_all(gi, items, exit_on_error=False, poll_policy=POLL_POLICY) == {'d1': 'ok', 'd2': 'failed_metadata'}
+        assert 'show_job' not in ''.join(gi.calls)
@@ -0,0 +1,98 @@
+import unittest
+
+from bioblend import ConnectionError
+
+from biomaj2galaxy.config import get_poll_policy
+from biomaj2galaxy.profiling import Profiler
+from biomaj2galaxy.utils import poll_intervals, run_steps, start_steps, wait_completion
+
+from .fake_galaxy import FakeGalaxy, POLL_POLICY
+
+
+def steps():
+    return [
+        {'name': 'fasta', 'job': {'tool_id': 'fasta_dm', 'params': {}, 'name': 'Fasta'}, 'depends': []},
+        {'name': 'manual', 'job': {'tool_id': 'manual_dm', 'params': {}, 'name': 'Manual'}, 'depends': ['fasta']},
+        {'name': 'other', 'job': {'tool_id': 'other_dm', 'params': {}, 'name': 'Other'}, 'depends': []},
+    ]
+
+
+class StepsTest(unittest.TestCase):
+
+    def test_start_steps(self):
+
+        gi = FakeGalaxy()
+        launched, waiting = start_steps(gi, steps())
+        assert [item['step'] for item in launched] == ['fasta', 'other']
+        assert [step['name'] for step in waiting] == ['manual']
+        assert gi.calls == ['run_tool:fasta_dm', 'run_tool:other_dm']
+
+        launched, waiting = start_steps(gi, waiting, done=['fasta', 'other'])
+        assert [item['step'] for item in launched] == ['manual']
+        assert waiting == []
+
+    def test_run_steps(self):
+
+        gi = FakeGalaxy()
+        submitted = run_steps(gi, steps(), poll_policy=POLL_POLICY)
+        assert [item['step'] for item in submitted] == ['fasta', 'other', 'manual']
+
+        # The manual job is only launched once the fasta job is finished, following the job states
+        assert gi.calls.index('run_tool:manual_dm') > gi.calls.index('get_state:j1')
+        assert all(c.startswith(('run_tool', 'get_state')) for c in gi.calls)
+
+    def test_run_steps_errors(self):
+
+        gi = FakeGalaxy(errors={'get_state': [ConnectionError("Timeout"), ConnectionError("Bad gateway", status_code=502)]})
+        assert len(run_steps(gi, steps(), poll_policy=POLL_POLICY)) == 3
+
+        gi = FakeGalaxy(errors={'get_state': [ConnectionError("Not found", status_code=404)]})
+        with self.assertRaises(ConnectionError):
+            run_steps(gi, steps(), poll_policy=POLL_POLICY)
+
+        gi = FakeGalaxy(errors={'get_state': [ConnectionError("Timeout")] * 60})
+        with self.assertRaises(Exception):
+            run_steps(gi, steps(), poll_policy=POLL_POLICY)
+
+    def test_poll_intervals(self):
+
+        intervals = poll_intervals({'min_interval': 1, 'max_interval': 4, 'factor': 2, 'jitter': 0})
+        assert [next(intervals) for i in range(5)] == [1, 2, 4, 4, 4]
+
+        intervals = poll_intervals({'min_interval': 10, 'max_interval': 10, 'jitter': 0.2})
+        assert all(8 <= next(intervals) <= 12 for i in range(100))
+
+        # Defaults for the missing values, and a maximum interval at least equal to the minimum one
+        assert get_poll_policy({'min_interval': 60, 'max_interval': None}) == {'min_interval': 60, 'max_interval': 60, 'factor': 1.5, 'jitter': 0.2}
+
+    def test_wait_completion(self):
+
+        gi = FakeGalaxy(states={'j1': ['queued', 'running', 'ok'], 'd1': ['running', 'failed_metadata']})
+        gi.profiler = Profiler()
+
+        # The job state is checked when the job id is known
+        assert wait_completion(gi, 'd1', 'j1', poll_policy=POLL_POLICY) == 'ok'
+        assert gi.calls == ['get_state:j1'] * 3
+        assert gi.profiler.waits['wait_completion']['count'] == 2
+
+        del gi.calls[:]
+        assert wait_completion(gi, 'd1', None, poll_policy=POLL_POLICY) == 'failed_metadata'
+        assert gi.calls == ['show_dataset:d1'] * 2
+
+    def test_wait_completion_errors(self):
+
+        gi = FakeGalaxy(states={'j1': 'error'}, errors={'get_state': [ConnectionError("Timeout"), ConnectionError("Bad gateway", status_code=502)]})
+
+        # Transient errors are retried, and the job details are shown when it failed
+        with self.assertRaises(Exception) as raised:
+            wait_completion(gi, 'd1', 'j1', poll_policy=POLL_POLICY)
+        assert "Job finished in error state" in str(raised.exception)
+        assert gi.calls == ['get_state:j1'] * 3 + ['show_job:j1']
+
+        del gi.calls[:]
+        assert wait_completion(gi, 'd1', 'j1', exit_on_error=False, poll_policy=POLL_POLICY) == 'error'
+        assert gi.calls == ['get_state:j1']
+
+        gi = FakeGalaxy(states={'j1': 'ok'}, errors={'get_state': [ConnectionError("Forbidden", status_code=403)]})
+        with self.assertRaises(ConnectionError):
+            wait_completion(gi, 'd1', 'j1', poll_policy=POLL_POLICY)
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from biomaj2galaxy import sync
+
+
+class SyncTest(unittest.TestCase):
+
+    def test_is_unchanged(self):
+
+        known = sync.file_info(self.path)
+
+        assert sync.is_unchanged(sync.file_info(self.path), known)
+
+        os.utime(self.path, (known['mtime'] + 10, known['mtime'] + 10))
+        assert not sync.is_unchanged(sync.file_info(self.path), known)
+
+    def test_is_unchanged_checksum(self):
+
+        known = dict(sync.file_info(self.path), hash=sync.file_hash(self.path))
+
+        os.utime(self.path, (known['mtime'] + 10, known['mtime'] + 10))
+        assert sync.is_unchanged(sync.file_info(self.path), known, checksum=True)
+
+        with open(self.path, 'w') as f:
+            f.write('ACGA\n')
+        assert not sync.is_unchanged(sync.file_info(self.path), known, checksum=True)
+
+    def test_is_unchanged_size(self):
+
+        known = sync.file_info(self.path)
+
+        with open(self.path, 'a') as f:
+            f.write('ACGT\n')
+        assert not sync.is_unchanged(sync.file_info(self.path), known, checksum=True)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'file.fa')
+        with open(self.path, 'w') as f:
+            f.write('ACGT\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.rmdir(self.tmp_dir)
@@ -0,0 +1,148 @@
+import json
+import time
+import unittest
+
+from bioblend import ConnectionError
+
+from biomaj2galaxy.config import tables_cache_path
+from biomaj2galaxy.utils import delete_rows, get_tables_format, read_tables_cache, reload_tables, write_tables_cache
+
+from .fake_galaxy import ConfigDirTestCase, FakeGalaxy, POLL_POLICY, run_command
+
+
+def shown(gi):
+    """Number of tables downloaded"""
+    return len([c for c in gi.calls if c.startswith('show_data_table')])
+
+
+class TablesTest(unittest.TestCase):
+
+    def test_reload_tables(self):
+
+        gi = FakeGalaxy()
+        gi.reloads = {
+            'all_fasta': [{'fields': [['hg19', 'old']]}, {'fields': [['hg19', 'new']]}],
+            'bowtie2_indexes': [{'fields': [['hg19', 'new']]}],
+            '__dbkeys__': [{'fields': [['hg19', 'Human']]}, {'fields': []}],
+        }
+        pending = reload_tables(gi, {
+            'all_fasta': {'present': [['hg19', 'new']], 'absent': [['hg19', 'old']]},
+            'bowtie2_indexes': {'present': [['hg19', 'new']]},
+            '__dbkeys__': {'absent': [['hg19', 'Human']]},
+        }, poll_policy=POLL_POLICY)
+        assert pending == []
+
+        # Only the tables not verified yet are reloaded again
+        assert sorted(gi.calls) == ['reload_data_table:__dbkeys__', 'reload_data_table:__dbkeys__', 'reload_data_table:all_fasta', 'reload_data_table:all_fasta', 'reload_data_table:bowtie2_indexes']
+
+    def test_reload_tables_errors(self):
+
+        gi = FakeGalaxy(tables={'all_fasta': {'columns': ['value'], 'fields': [['hg19']]}, 'other': {'columns': ['value'], 'fields': []}})
+        gi.errors = {'reload_data_table:all_fasta': [ConnectionError("Bad gateway", status_code=502)]}
+        gi.reloads = {'no_content': [None]}
+        pending = reload_tables(gi, {'all_fasta': {'present': [['hg19']]}, 'other': {'present': [['hg19']]}, 'no_content': {}}, attempts=3, poll_policy=POLL_POLICY)
+        assert pending == ['other']
+        assert gi.calls.count('reload_data_table:all_fasta') == 2
+        assert gi.calls.count('reload_data_table:other') == 3
+        assert gi.calls.count('reload_data_table:no_content') == 1
+
+        # A list of names: only reloaded
+        gi = FakeGalaxy(tables={'all_fasta': {'columns': ['value'], 'fields': []}})
+        assert reload_tables(gi, ['all_fasta'], poll_policy=POLL_POLICY) == []
+
+    def test_delete_rows(self):
+
+        gi = FakeGalaxy(errors={
+            'delete_data_table:all_fasta:hg19\tb': [ConnectionError("Timeout"), ConnectionError("Service unavailable", status_code=503)],
+            'delete_data_table:all_fasta:hg19\tc': [ConnectionError("Not found", status_code=404)],
+            'delete_data_table:bowtie2_indexes:hg19\td': [ConnectionError("Timeout")] * 5,
+        })
+        rows = [
+            ('all_fasta', ['hg19', 'a']),
+            ('all_fasta', ['hg19', 'b']),
+            ('all_fasta', ['hg19', 'c']),
+            ('bowtie2_indexes', ['hg19', 'd']),
+            ('all_fasta', ['hg19', 'e']),
+        ]
+        deleted, failed = delete_rows(gi, rows, attempts=3, poll_policy=POLL_POLICY)
+
+        # Transient errors are retried, the other ones are not
+        assert deleted == {'all_fasta': [['hg19', 'a'], ['hg19', 'b'], ['hg19', 'e']]}
+        assert failed == {'all_fasta': [['hg19', 'c']], 'bowtie2_indexes': [['hg19', 'd']]}
+        assert gi.calls.count('delete_data_table:all_fasta:hg19\tc') == 1
+        assert gi.calls.count('delete_data_table:bowtie2_indexes:hg19\td') == 3
+
+        # The rows of a table are deleted in order
+        assert [c.split(':')[2] for c in gi.calls if c.startswith('delete_data_table:all_fasta:')] == ['hg19\ta', 'hg19\tb', 'hg19\tb', 'hg19\tb', 'hg19\tc', 'hg19\te']
+
+
+class TablesCacheTest(ConfigDirTestCase):
+
+    def test_cache(self):
+
+        gi = FakeGalaxy()
+        assert read_tables_cache(gi, 100) is None
+
+        write_tables_cache(gi, {'all_fasta': ['value', 'path']})
+        assert read_tables_cache(gi, 100) == {'all_fasta': ['value', 'path']}
+
+        # Another instance
+        assert read_tables_cache(FakeGalaxy(base_url='http://other'), 100) is None
+
+        # Too old
+        with open(tables_cache_path(gi.base_url)) as f:
+            cache = json.load(f)
+        cache['time'] = time.time() - 200
+        with open(tables_cache_path(gi.base_url), 'w') as f:
+            json.dump(cache, f)
+        assert read_tables_cache(gi, 100) is None
+        assert read_tables_cache(gi, 300) == {'all_fasta': ['value', 'path']}
+
+    def test_get_tables_format(self):
+
+        gi = FakeGalaxy(tables={'all_fasta': {'columns': ['value', 'path'], 'fields': []}, 'twobit': {'columns': ['value', 'path', 'name'], 'fields': []}})
+
+        assert get_tables_format(gi, cache_ttl=100) == {'all_fasta': ['value', 'path'], 'twobit': ['value', 'path']}
+        assert shown(gi) == 2
+
+        # From the cache
+        gi.tables['new_table'] = {'columns': ['value'], 'fields': []}
+        assert 'new_table' not in get_tables_format(gi, cache_ttl=100)
+        assert shown(gi) == 2
+
+        # Refreshed, and cached again
+        assert 'new_table' in get_tables_format(gi, cache_ttl=100, refresh=True)
+        assert shown(gi) == 5
+        assert 'new_table' in get_tables_format(gi, cache_ttl=100)
+        assert shown(gi) == 5
+
+        # Without cache
+        get_tables_format(gi, cache_ttl=0)
+        assert shown(gi) == 8
+
+    def test_add_unknown_table(self):
+
+        gi = FakeGalaxy(tables={'all_fasta': {'columns': ['value', 'path'], 'fields': []}})
+        write_tables_cache(gi, {'all_fasta': ['value', 'path']})
+
+        # The cache is refreshed when a table is not found in it
+        result = run_command(gi, ['add', '--no-file-check', 'unknown_table:/some/file'])
+        assert 'Unknown data table name "unknown_table"' in str(result.exception)
+        assert shown(gi) == 1
+
+        # Not several times
+        del gi.calls[:]
+        result = run_command(gi, ['add', '--no-file-check', 'unknown_table:/some/file', 'other_table:/some/file'])
+        assert 'Unknown data table name "unknown_table"' in str(result.exception)
+        assert gi.calls.count('get_data_tables') == 1
+
+    def test_add_removed_table(self):
+
+        gi = FakeGalaxy(tables={'__dbkeys__': {'columns': ['value', 'name', 'len_path'], 'fields': []}})
+        write_tables_cache(gi, {'__dbkeys__': ['value', 'name', 'len_path'], 'blastdb': ['value', 'name', 'path']})
+
+        # The cache is refreshed when a cached table is no longer in Galaxy
+        result = run_command(gi, ['add', '--no-file-check', '-d', 'hg19', 'blastdb:/some/file'])
+        assert 'Unknown data table name "blastdb"' in str(result.exception)
+        assert gi.calls.count('get_data_tables') == 1
+        assert read_tables_cache(gi, 100) == {'__dbkeys__': ['value', 'name', 'len_path']}
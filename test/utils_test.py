@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from biomaj2galaxy import utils
+
+
+class UtilsTest(unittest.TestCase):
+
+    rows = [
+        ['hg19', 'Human hg19'],
+        ['hg38', 'Human hg38'],
+        ['hg19_female', 'Human hg19 female'],
+        ['mm10', 'Mouse mm10'],
+        ['broken'],
+        ['hg19', 'Human hg19 again'],
+    ]
+
+    def test_match_rows_prefix(self):
+
+        index = utils.index_rows(self.rows, 1)
+        assert utils.match_rows(index, ['Human hg19']) == [0, 2, 5]
+
+        index = utils.index_rows(self.rows, 0)
+        assert utils.match_rows(index, ['hg19']) == [0, 2, 5]
+        assert utils.match_rows(index, ['hg19', 'mm']) == [0, 2, 3, 5]
+        assert utils.match_rows(index, ['zz']) == []
+
+    def test_match_rows_exact(self):
+
+        index = utils.index_rows(self.rows, 0)
+        assert utils.match_rows(index, ['hg19'], exact=True) == [0, 5]
+        assert utils.match_rows(index, ['hg1'], exact=True) == []
+
+    def test_match_rows_glob(self):
+
+        index = utils.index_rows(self.rows, 0)
+        assert utils.match_rows(index, ['hg*']) == [0, 1, 2, 5]
+        assert utils.match_rows(index, ['hg?9'], exact=True) == [0, 5]
+        assert utils.match_rows(index, ['*_female'], exact=True) == [2]
+
+    def test_match_rows_regex(self):
+
+        index = utils.index_rows(self.rows, 0)
+        assert utils.match_rows(index, ['hg(19|38)'], regex=True) == [0, 1, 2, 5]
+        assert utils.match_rows(index, ['hg(19|38)'], exact=True, regex=True) == [0, 1, 5]
+
+    def test_isfile_wo_ext(self):
+
+        tmp_dir = tempfile.mkdtemp()
+        for fn in ['genome.1.bt2', 'genome.2.bt2', 'genome.fa', 'other']:
+            open(os.path.join(tmp_dir, fn), 'w').close()
+        os.mkdir(os.path.join(tmp_dir, 'subdir'))
+
+        try:
+            assert utils.isfile_wo_ext(os.path.join(tmp_dir, 'genome'))
+            assert utils.isfile_wo_ext(os.path.join(tmp_dir, 'genome.fa'))
+            assert utils.isfile_wo_ext(os.path.join(tmp_dir, 'other'))
+            assert not utils.isfile_wo_ext(os.path.join(tmp_dir, 'genom'))
+            assert not utils.isfile_wo_ext(os.path.join(tmp_dir, 'subdir'))
+            assert not utils.isfile_wo_ext(os.path.join(tmp_dir, 'missing', 'file'))
+
+            # Created after the directory was listed
+            open(os.path.join(tmp_dir, 'new.fa'), 'w').close()
+            assert utils.isfile_wo_ext(os.path.join(tmp_dir, 'new'))
+        finally:
+            for fn in os.listdir(tmp_dir):
+                if fn == 'subdir':
+                    os.rmdir(os.path.join(tmp_dir, fn))
+                else:
+                    os.remove(os.path.join(tmp_dir, fn))
+            os.rmdir(tmp_dir)
+
+    def test_sources_by_folder(self):
+
+        tmp_dir = tempfile.mkdtemp()
+        for path in ['fasta/all.fa', 'fasta/chr/chr1.fa', 'blast/all.fa', 'other/fasta/x.fa', 'README']:
+            if not os.path.isdir(os.path.dirname(os.path.join(tmp_dir, path))):
+                os.makedirs(os.path.dirname(os.path.join(tmp_dir, path)))
+            open(os.path.join(tmp_dir, path), 'w').close()
+        os.symlink(tmp_dir, os.path.join(tmp_dir, 'fasta', 'current'))
+
+        def source(path):
+            return os.path.join(tmp_dir, path)
+
+        try:
+            by_folder = utils.sources_by_folder([source('fasta'), source('blast'), source('README')], ('v1',))
+            assert by_folder == {
+                ('v1',): [source('README')],
+                ('v1', 'fasta'): [source('fasta/all.fa')],
+                ('v1', 'fasta', 'chr'): [source('fasta/chr/chr1.fa')],
+                ('v1', 'blast'): [source('blast/all.fa')],
+            }
+
+            with self.assertRaises(Exception):
+                utils.sources_by_folder([source('fasta'), source('other/fasta')], ())
+
+            with self.assertRaises(Exception):
+                utils.sources_by_folder([source('fasta/all.fa'), source('blast/all.fa')], ())
+        finally:
+            shutil.rmtree(tmp_dir)